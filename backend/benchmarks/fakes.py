@@ -0,0 +1,121 @@
+"""
+Deterministic local stand-ins for the services the benchmarks must not depend on:
+Gemini (genai.Client and the query LLM), the HuggingFace embedding model, Kokoro TTS
+and Docling. Each one does a small, fixed amount of work per input so results depend
+on this code, not on network or GPU availability. Simulated latencies are optional.
+"""
+import asyncio
+import json
+import re
+import time
+import zlib
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+WORD_RE = re.compile(r"\w+")
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Hashed bag-of-words vectors: texts sharing words get similar embeddings, so retrieval
+    still returns meaningful neighbours. latency_ms is added once per call (not per text),
+    like a batched model call.
+    """
+
+    dimension: int = 384
+    latency_ms: float = 0.0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in WORD_RE.findall(text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _wait(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._wait()
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._wait()
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._wait()
+        return [self._vector(text) for text in texts]
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        self._wait()
+        return [self._vector(query) for query in queries]
+
+
+class _FakeModels:
+    def __init__(self, latency_ms: float, dialogue_turns: int):
+        self._latency_ms = latency_ms
+        self._dialogue_turns = dialogue_turns
+
+    async def generate_content(self, model=None, config=None, contents=None):
+        if self._latency_ms:
+            await asyncio.sleep(self._latency_ms / 1000)
+        prompt = "\n".join(str(part) for part in (contents or []))
+        words = WORD_RE.findall(prompt)
+        if "podcast dialogue" in prompt:
+            # The dialogue stage must return the JSON the TTS stage parses
+            turns = [
+                {
+                    "speaker": "expert" if i % 2 == 0 else "novice",
+                    "text": " ".join(words[i * 40:(i + 1) * 40]) or "Let us continue.",
+                }
+                for i in range(self._dialogue_turns)
+            ]
+            return SimpleNamespace(text=json.dumps(turns))
+        return SimpleNamespace(text=" ".join(words[:300]))
+
+
+class FakeGenaiClient:
+    """Stand-in for google.genai.Client: client.aio.models.generate_content, as the podcast stages use it."""
+
+    latency_ms = 0.0
+    dialogue_turns = 12
+
+    def __init__(self, api_key=None, **kwargs):
+        self.aio = SimpleNamespace(models=_FakeModels(self.latency_ms, self.dialogue_turns))
+
+
+class FakeKPipeline:
+    """
+    Stand-in for a Kokoro KPipeline: yields one (graphemes, phonemes, audio) segment per
+    line of text, with ~60 samples of a quiet tone per character (~2.5 ms at 24 kHz).
+    """
+
+    samples_per_char = 60
+    latency_ms_per_char = 0.0
+
+    def __call__(self, text, voice=None, speed=1, split_pattern=None):
+        for line in re.split(split_pattern or r"\n+", text):
+            if not line.strip():
+                continue
+            if self.latency_ms_per_char:
+                time.sleep(len(line) * self.latency_ms_per_char / 1000)
+            samples = np.arange(len(line) * self.samples_per_char, dtype=np.float32)
+            yield line, line, 0.1 * np.sin(samples * 2 * np.pi * 220 / 24000)
+
+
+def fake_convert_file(file_path: str):
+    """Stand-in for Docling: the synthetic documents are plain text."""
+    with open(file_path, encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,434 @@
+"""
+End-to-end benchmarks of the upload -> ingestion -> query -> podcast flow.
+
+Generates synthetic spaces, drives the FastAPI app in-process (httpx over ASGI) with
+deterministic local fakes for Gemini, the embedding model, Kokoro and Docling (see
+benchmarks/fakes.py), and reports per endpoint: throughput, p50/p95/p99 latency and the
+process peak RSS. Everything runs in a temporary working directory (database, Chroma,
+caches, podcasts), so the real data is never touched. Run from the backend directory:
+
+    python -m benchmarks.run --spaces 2 --documents 4 --pages 20 --output bench.json
+    python -m benchmarks.run --output bench_new.json --compare bench.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+JOB_POLL_SECONDS = 0.05
+FINISHED = ("completed", "failed", "cancelled")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Memorize end-to-end benchmarks with offline fakes")
+    parser.add_argument("--spaces", type=int, default=2)
+    parser.add_argument("--documents", type=int, default=4, help="Documents per space")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--chunk-size", type=int, default=None, help="Space chunk size (default DEFAULT_CHUNK_SIZE)")
+    parser.add_argument("--chunk-overlap", type=int, default=None)
+    parser.add_argument("--queries", type=int, default=50, help="Requests per query scenario")
+    parser.add_argument("--batch-size", type=int, default=16, help="Queries per /retrieve batch request")
+    parser.add_argument("--podcasts", type=int, default=1, help="Podcasts generated per space (0 skips the podcast scenarios)")
+    parser.add_argument("--podcast-turns", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--layout", choices=("per_space", "shared"), default="per_space", help="VECTOR_STORE_LAYOUT")
+    parser.add_argument("--audio-format", choices=("wav", "opus", "mp3"), default="wav", help="opus/mp3 need ffmpeg")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated latency per embedding call")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency per podcast LLM call")
+    parser.add_argument("--tts-latency-ms-per-char", type=float, default=0.0)
+    parser.add_argument("--embedding-cache", action="store_true", help="Keep the chunk embedding cache enabled")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the semantic response cache enabled")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--workdir", default=None, help="Working directory (default: a new temporary one)")
+    parser.add_argument("--keep-workdir", action="store_true")
+    parser.add_argument("--output", default=None, help="Write the results as JSON here")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.2, help="Relative p95/throughput change flagged as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, workdir: Path):
+    """Must run before anything imports config: settings are read from the environment at import."""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "GOOGLE_API_KEY": "benchmark",
+        "WARMUP_MODELS": "",
+        "EMBEDDING_SERVER_ADDRESS": "",
+        "CONVERSION_WORKERS": "0",
+        "EMBEDDING_CACHE_ENABLED": "1" if args.embedding_cache else "0",
+        "RESPONSE_CACHE_ENABLED": "1" if args.response_cache else "0",
+        "DATABASE_URL": f"sqlite:///{(workdir / 'memorize.db').as_posix()}",
+        "VECTOR_STORE_LAYOUT": args.layout,
+        "PODCAST_AUDIO_FORMAT": args.audio_format,
+    })
+
+
+def install_fakes(args, workdir: Path):
+    """Swaps the external models and services for the fakes in benchmarks/fakes.py."""
+    from llama_index.core import Settings
+    from benchmarks import fakes
+    from routers import podcast as podcast_router
+    from services import document_conversion, podcast_audio_generator, podcast_jobs, resources
+
+    embed_model = fakes.FakeEmbedding(model_name="fake-hashed-bow", latency_ms=args.embed_latency_ms)
+    if args.embedding_cache:
+        from services.cached_embedding import CachedEmbedding
+        embed_model = CachedEmbedding(embed_model)
+
+    def load_embed_model():
+        Settings.embed_model = embed_model
+        return embed_model
+
+    resources.override("embedding_model", load_embed_model)
+    resources.override("tts_model", lambda: None)
+
+    fakes.FakeKPipeline.latency_ms_per_char = args.tts_latency_ms_per_char
+    podcast_audio_generator.get_tts_pipeline = fakes.FakeKPipeline
+    podcasts_folder = str((workdir / "podcasts").as_posix())
+    podcast_audio_generator.PODCASTS_FOLDER = podcasts_folder
+    podcast_router.PODCASTS_FOLDER = podcasts_folder
+
+    fakes.FakeGenaiClient.latency_ms = args.llm_latency_ms
+    fakes.FakeGenaiClient.dialogue_turns = args.podcast_turns
+    podcast_jobs.genai = SimpleNamespace(Client=fakes.FakeGenaiClient)
+
+    document_conversion.convert_file = fakes.fake_convert_file
+
+
+class Corpus:
+    """Synthetic course material: Zipf-distributed pseudo-words, paragraphs of sentences, pages of paragraphs."""
+
+    def __init__(self, seed: int, vocabulary_size: int = 5000):
+        self.rng = random.Random(seed)
+        self.vocabulary = [
+            "".join(self.rng.choice(string.ascii_lowercase) for _ in range(self.rng.randint(3, 11)))
+            for _ in range(vocabulary_size)
+        ]
+        weights = 1.0 / np.arange(1, vocabulary_size + 1)
+        self.cumulative_weights = list(np.cumsum(weights))
+
+    def words(self, count: int):
+        return self.rng.choices(self.vocabulary, cum_weights=self.cumulative_weights, k=count)
+
+    def document(self, pages: int, words_per_page: int) -> str:
+        paragraphs = []
+        for _ in range(pages):
+            for _ in range(4):
+                words = self.words(words_per_page // 4)
+                sentences = [" ".join(words[i:i + 15]).capitalize() + "." for i in range(0, len(words), 15)]
+                paragraphs.append(" ".join(sentences))
+        return "\n\n".join(paragraphs)
+
+    def queries(self, count: int):
+        return [" ".join(self.words(self.rng.randint(3, 8))) for _ in range(count)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where getrusage is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def latency_summary(latencies):
+    """mean/p50/p95/p99/max in milliseconds of latencies given in seconds, or None if there are none."""
+    if not len(latencies):
+        return None
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "mean": round(float(latencies_ms.mean()), 3),
+        "p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99": round(float(np.percentile(latencies_ms, 99)), 3),
+        "max": round(float(latencies_ms.max()), 3),
+    }
+
+
+def summarize(latencies, errors: int, wall_seconds: float, rss_before, extras):
+    rss_after = peak_rss_mb()
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(latencies) / wall_seconds, 3) if wall_seconds > 0 else None,
+        "latency_ms": latency_summary(latencies),
+        "peak_rss_mb": rss_after,
+        "peak_rss_growth_mb": round(rss_after - rss_before, 1) if rss_after is not None else None,
+    }
+    summary.update(extras)
+    return summary
+
+
+async def run_scenario(name: str, calls, concurrency: int, results: dict):
+    """
+    Runs the calls (coroutine factories returning a dict of numeric extras, or raising on
+    failure) with bounded concurrency, and records the scenario summary under results[name].
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    extras = {}
+    errors = 0
+    rss_before = peak_rss_mb() or 0
+
+    async def timed(call):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                for key, value in ((await call()) or {}).items():
+                    extras[key] = extras.get(key, 0) + value
+            except Exception as e:
+                errors += 1
+                print(f"[{name}] {e}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    results[name] = summarize(latencies, errors, time.perf_counter() - start, rss_before, extras)
+    latency = results[name]["latency_ms"] or {}
+    print(f"{name:<22} {len(latencies):>5} req  {results[name]['throughput_per_second'] or 0:>9.2f}/s  "
+          f"p50 {latency.get('p50', 0):>9.2f} ms  p95 {latency.get('p95', 0):>9.2f} ms  "
+          f"p99 {latency.get('p99', 0):>9.2f} ms  errors {errors}")
+
+
+def _check(response, status=(200,)):
+    if response.status_code not in status:
+        raise Exception(f"{response.request.method} {response.request.url.path} -> {response.status_code}: {response.text[:200]}")
+    return response.json()
+
+
+async def wait_for_job(client, url: str):
+    while True:
+        job = _check(await client.get(url))
+        if job["status"] in FINISHED:
+            if job["status"] != "completed":
+                raise Exception(f"Job {job['job_id']} {job['status']}: {job.get('error')}")
+            return job
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+async def run_benchmarks(args, app):
+    import httpx
+
+    corpus = Corpus(args.seed)
+    queries = corpus.queries(args.queries)
+    results = {}
+    space_ids = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+        def create_space(i):
+            async def call():
+                params = {"space_name": f"bench-{i}"}
+                if args.chunk_size:
+                    params["chunk_size"] = args.chunk_size
+                if args.chunk_overlap is not None:
+                    params["chunk_overlap"] = args.chunk_overlap
+                space_ids.append(_check(await client.post("/createspace/", params=params))["space_id"])
+            return call
+        await run_scenario("create_space", [create_space(i) for i in range(args.spaces)], 1, results)
+        space_ids.sort()
+
+        def upload(space_id, i):
+            text = corpus.document(args.pages, args.words_per_page)
+            async def call():
+                files = [("files", (f"document_{space_id}_{i}.txt", text.encode("utf-8"), "text/plain"))]
+                _check(await client.post("/upload/", params={"space_id": space_id, "wait": True}, files=files))
+                return {"bytes_uploaded": len(text)}
+            return call
+        await run_scenario(
+            "upload",
+            [upload(space_id, i) for space_id in space_ids for i in range(args.documents)],
+            args.concurrency, results,
+        )
+
+        def ingest(space_id):
+            async def call():
+                queued = _check(await client.post(f"/ingestion/{space_id}"), status=(200, 202))
+                if "job_id" not in queued:
+                    return {}
+                job = await wait_for_job(client, f"/ingestion/jobs/{queued['job_id']}")
+                return {"documents_processed": job["progress"]["documents_processed"],
+                        "nodes_processed": job["progress"]["nodes_processed"]}
+            return call
+        await run_scenario("ingestion", [ingest(space_id) for space_id in space_ids], args.concurrency, results)
+        ingestion = results["ingestion"]
+        if ingestion["wall_seconds"]:
+            ingestion["nodes_per_second"] = round(ingestion.get("nodes_processed", 0) / ingestion["wall_seconds"], 3)
+
+        def post(path, payload):
+            async def call():
+                _check(await client.post(path, json=payload))
+            return call
+
+        first_event_latencies = []
+
+        def post_stream(path, payload):
+            # SSE body: read events up to the final 'done' instead of decoding JSON
+            async def call():
+                start = time.perf_counter()
+                events = 0
+                async with client.stream("POST", path, json=payload) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        _check(response)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("event: "):
+                            continue
+                        if not events:
+                            first_event_latencies.append(time.perf_counter() - start)
+                        events += 1
+                        event = line[len("event: "):]
+                        if event == "error":
+                            raise Exception(f"POST {path} -> error event")
+                        if event == "done":
+                            return {"events": events}
+                raise Exception(f"POST {path} -> stream ended without a 'done' event")
+            return call
+
+        def space_for(i):
+            return space_ids[i % len(space_ids)]
+
+        await run_scenario("query", [
+            post(f"/query/{space_for(i)}", {"query_text": query}) for i, query in enumerate(queries)
+        ], args.concurrency, results)
+        await run_scenario("query_stream", [
+            post_stream(f"/query/{space_for(i)}/stream", {"query_text": query}) for i, query in enumerate(queries)
+        ], args.concurrency, results)
+        # Time to the first ('sources') event. httpx's ASGI transport may only hand the body over
+        # once the app has finished, so in-process this is an upper bound of what a socket client sees
+        results["query_stream"]["first_event_ms"] = latency_summary(first_event_latencies)
+        await run_scenario("retrieve", [
+            post(f"/retrieve/{space_for(i)}", {"query_text": query}) for i, query in enumerate(queries)
+        ], args.concurrency, results)
+        batches = [queries[i:i + args.batch_size] for i in range(0, len(queries), args.batch_size)]
+        await run_scenario("retrieve_batch", [
+            post(f"/retrieve/{space_for(i)}/batch", {"query_texts": batch}) for i, batch in enumerate(batches)
+        ], args.concurrency, results)
+        results["retrieve_batch"]["queries_per_second"] = round(
+            len(queries) / results["retrieve_batch"]["wall_seconds"], 3
+        ) if results["retrieve_batch"]["wall_seconds"] else None
+        await run_scenario("cross_space_query", [
+            post("/query", {"query_text": query, "space_ids": space_ids}) for query in queries
+        ], args.concurrency, results)
+
+        if args.podcasts:
+            audio_urls = []
+
+            def podcast(space_id):
+                async def call():
+                    queued = _check(await client.post(f"/createpodcast/{space_id}", params={"use_cache": False}), status=(202,))
+                    job = await wait_for_job(client, f"/podcast/jobs/{queued['data']['job_id']}")
+                    audio_urls.append(job["result"]["audio_url"])
+                    return {"turns_rendered": job["progress"]["turns_rendered"]}
+                return call
+            await run_scenario("podcast", [
+                podcast(space_id) for space_id in space_ids for _ in range(args.podcasts)
+            ], args.concurrency, results)
+
+            def audio_range(url):
+                async def call():
+                    response = await client.get(url, headers={"Range": "bytes=0-65535"})
+                    if response.status_code not in (200, 206):
+                        raise Exception(f"GET {url} -> {response.status_code}")
+                    return {"bytes_served": len(response.content)}
+                return call
+            await run_scenario("podcast_audio_range", [
+                audio_range(audio_urls[i % len(audio_urls)]) for i in range(args.queries)
+            ] if audio_urls else [], args.concurrency, results)
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Prints p95 latency and throughput changes per scenario. Returns the regressed scenario names."""
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')}):")
+    for name, current in results.items():
+        previous = baseline["scenarios"].get(name)
+        if not previous or not current.get("latency_ms") or not previous.get("latency_ms"):
+            continue
+        p95_change = current["latency_ms"]["p95"] / previous["latency_ms"]["p95"] - 1 if previous["latency_ms"]["p95"] else 0.0
+        throughput_change = (
+            current["throughput_per_second"] / previous["throughput_per_second"] - 1
+            if previous.get("throughput_per_second") else 0.0
+        )
+        regressed = p95_change > threshold or throughput_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<22} p95 {p95_change:+7.1%}  throughput {throughput_change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="memorize-bench-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    output = Path(args.output).resolve() if args.output else None
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    configure_environment(args, workdir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(workdir)  # Relative storage paths (Chroma, index_storage, caches, uploads) land here
+
+    try:
+        import main as app_module
+        install_fakes(args, workdir)
+        started = time.time()
+        scenarios = asyncio.run(run_benchmarks(args, app_module.app))
+    finally:
+        os.chdir(BACKEND_DIR)
+        if not args.keep_workdir and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "git_commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "workdir")},
+        },
+        "scenarios": scenarios,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {output}")
+
+    if baseline:
+        regressions = compare(scenarios, baseline, args.regression_threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Heavy resources (services/resources.py) load on first use; these are loaded in the background
+# at startup and gate /readyz. Known names: embedding_model, llm, tts_model, document_converter. Empty disables warm-up.
+WARMUP_MODELS = [name.strip() for name in os.getenv("WARMUP_MODELS", "embedding_model,llm").split(",") if name.strip()]
+
+# Database (database.py). SQLite by default; set a postgresql:// URL for multi-node deployments.
+# Routers use an async engine (aiosqlite / asyncpg), background jobs a sync one on the same database.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./memorize.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Loaded space indexes kept in memory by services/index_cache.py
+INDEX_CACHE_MAX_SPACES = int(os.getenv("INDEX_CACHE_MAX_SPACES", "8"))
+INDEX_CACHE_MAX_MB = int(os.getenv("INDEX_CACHE_MAX_MB", "1024"))
+
+# Persisted per-space BM25 index (services/bm25_store.py); memory-map it instead of reading it into RAM
+BM25_MMAP = os.getenv("BM25_MMAP", "1") == "1"
+
+# Vector store layout (services/vector_store.py): "per_space" (a Chroma directory per space) or
+# "shared" (one collection filtered by space_id; migrate with python -m services.vector_store migrate)
+VECTOR_STORE_LAYOUT = os.getenv("VECTOR_STORE_LAYOUT", "per_space")
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+CHROMA_SHARED_COLLECTION = os.getenv("CHROMA_SHARED_COLLECTION", "memorize_chunks")
+
+# Per-space node docstore (services/docstore.py): "sqlite" (append-friendly) or "json" (SimpleDocumentStore)
+DOCSTORE_BACKEND = os.getenv("DOCSTORE_BACKEND", "sqlite")
+
+# Background ingestion jobs (services/ingestion_jobs.py)
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_MAX_JOBS_PER_SPACE = int(os.getenv("INGESTION_MAX_JOBS_PER_SPACE", "1"))
+INGESTION_BATCH_DOCUMENTS = int(os.getenv("INGESTION_BATCH_DOCUMENTS", "4"))
+# Streaming chunking pipeline (services/embedding_service.py): nodes are embedded and stored in batches,
+# documents split in parallel, and very long documents split a segment at a time
+INGESTION_EMBED_BATCH_NODES = int(os.getenv("INGESTION_EMBED_BATCH_NODES", "256"))
+INGESTION_SPLIT_WORKERS = int(os.getenv("INGESTION_SPLIT_WORKERS", "4"))
+INGESTION_SEGMENT_CHARS = int(os.getenv("INGESTION_SEGMENT_CHARS", "200000"))
+# Chunking for spaces that do not set their own chunk_size/chunk_overlap
+DEFAULT_CHUNK_SIZE = int(os.getenv("DEFAULT_CHUNK_SIZE", "512"))
+DEFAULT_CHUNK_OVERLAP = int(os.getenv("DEFAULT_CHUNK_OVERLAP", "200"))
+
+# Uploads (routers/upload.py): streamed to disk in chunks, Docling conversion in a process pool
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", "2"))  # 0 converts in the API process
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "4"))
+
+# Content-addressed caches shared by all spaces (services/content_cache.py)
+CONTENT_CACHE_PATH = os.getenv("CONTENT_CACHE_PATH", "./cache/content_cache.db")
+CONVERSION_CACHE_MAX_MB = int(os.getenv("CONVERSION_CACHE_MAX_MB", "512"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "2048"))
+
+# Embedding model (services/embedding_backends.py); EMBEDDING_DEVICE "auto" picks CUDA when available
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "auto")
+# "torch" (fp32), "onnx" or "onnx-int8" (dynamically quantized, CPU); EMBEDDING_THREADS 0 = library default
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "avx512_vnni")  # or "avx2", "arm64"
+EMBEDDING_MODELS_DIR = os.getenv("EMBEDDING_MODELS_DIR", "./models")
+
+# Shared embedding server (services/embedding_server.py); leave the address empty to embed in-process
+EMBEDDING_SERVER_ADDRESS = os.getenv("EMBEDDING_SERVER_ADDRESS", "")
+# Required with the server: it and its clients exchange pickles, so the key is what keeps others out.
+# Generate one with: python -c "import secrets; print(secrets.token_hex(32))"
+EMBEDDING_SERVER_AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY", "").encode()
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "64"))
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", "5"))
+
+# LLM used by /query (services/llm_service.py): "gemini", or "fake" for a local MockLLM
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+QUERY_LLM_MODEL = os.getenv("QUERY_LLM_MODEL", "models/gemini-1.5-flash")
+FAKE_LLM_MAX_TOKENS = int(os.getenv("FAKE_LLM_MAX_TOKENS", "64"))
+
+# Semantic response cache for /query (services/response_cache.py)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_SPACES = int(os.getenv("RESPONSE_CACHE_MAX_SPACES", "256"))
+
+# Hybrid retrieval (services/hybrid_retriever.py): vector and BM25 sides of every query run on this pool
+HYBRID_RETRIEVER_WORKERS = int(os.getenv("HYBRID_RETRIEVER_WORKERS", "16"))
+
+# Cross-space search (POST /query): per-space retrieval fans out over this many threads
+MULTI_SPACE_QUERY_WORKERS = int(os.getenv("MULTI_SPACE_QUERY_WORKERS", "8"))
+MULTI_SPACE_MAX_SPACES = int(os.getenv("MULTI_SPACE_MAX_SPACES", "50"))
+
+# Retrieval-only endpoints (/retrieve); /query defaults are 5 vector + 2 BM25 results fused to the top 2
+QUERY_VECTOR_TOP_K = int(os.getenv("QUERY_VECTOR_TOP_K", "5"))
+QUERY_BM25_TOP_K = int(os.getenv("QUERY_BM25_TOP_K", "2"))
+QUERY_TOP_K = int(os.getenv("QUERY_TOP_K", "2"))
+RETRIEVE_BATCH_MAX_QUERIES = int(os.getenv("RETRIEVE_BATCH_MAX_QUERIES", "64"))
+
+# Podcast script generation (services/podcast_pipeline.py); stage outputs are cached on disk by input hash
+PODCAST_LLM_MODEL = os.getenv("PODCAST_LLM_MODEL", "gemini-2.0-flash")
+PODCAST_STAGE_CACHE_DIR = os.getenv("PODCAST_STAGE_CACHE_DIR", "./cache/podcast_stages")
+PODCAST_STAGE_CACHE_TTL_SECONDS = float(os.getenv("PODCAST_STAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Podcast context building (services/podcast_context.py); token counts are estimated at ~4 characters per token
+PODCAST_CONTEXT_TOKEN_BUDGET = int(os.getenv("PODCAST_CONTEXT_TOKEN_BUDGET", "60000"))
+PODCAST_RETRIEVAL_TOP_K = int(os.getenv("PODCAST_RETRIEVAL_TOP_K", "200"))
+PODCAST_MAP_BATCH_TOKENS = int(os.getenv("PODCAST_MAP_BATCH_TOKENS", "8000"))
+PODCAST_MAP_CONCURRENCY = int(os.getenv("PODCAST_MAP_CONCURRENCY", "4"))
+PODCAST_REDUCE_MAX_TOKENS = int(os.getenv("PODCAST_REDUCE_MAX_TOKENS", "12000"))
+
+# Podcast TTS (services/podcast_audio_generator.py): turns rendered in parallel, clips cached on disk
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", str(max(1, (os.cpu_count() or 4) // 4))))
+# Split the cores between the TTS workers so parallel turns do not oversubscribe the CPU; 0 = torch default
+TTS_TORCH_THREADS = int(os.getenv("TTS_TORCH_THREADS", str(max(1, (os.cpu_count() or 4) // TTS_WORKERS))))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./cache/tts")
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "2048"))
+
+# Podcast jobs and output encoding (services/podcast_jobs.py); "opus" and "mp3" need ffmpeg on the PATH
+# (without it, podcasts fall back to WAV)
+PODCAST_WORKERS = int(os.getenv("PODCAST_WORKERS", "2"))
+PODCAST_AUDIO_FORMAT = os.getenv("PODCAST_AUDIO_FORMAT", "opus")  # "opus", "mp3" or "wav"
+PODCAST_AUDIO_BITRATE = os.getenv("PODCAST_AUDIO_BITRATE", "48k")
+
+# Metrics (services/metrics.py, GET /metrics): share of calls of the hot-path stages that are timed
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "0.1"))
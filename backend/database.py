@@ -1,48 +1,101 @@
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, DateTime, ForeignKey, Text, Boolean # Import Text and Boolean
-from sqlalchemy.sql import func
-from sqlalchemy.orm import sessionmaker, Session
-
-DATABASE_URL = "sqlite:///./memorize.db"
-engine = create_engine(DATABASE_URL)
-metadata = MetaData()
-
-spaces_table = Table(
-    "spaces",
-    metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("name", String, nullable=False),
-    Column("created_at", DateTime(timezone=True), server_default=func.now())
-)
-
-documents_table = Table(
-    "documents",
-    metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("space_id", Integer, ForeignKey("spaces.id"), nullable=False),
-    Column("title", String, nullable=False),
-    Column("extracted_text", Text),  # Changed to Text
-    Column("uploaded_at", DateTime(timezone=True), server_default=func.now()),
-    Column("is_embedded", Boolean, server_default='0')
-)
-
-podcasts_table = Table( # Optional
-    "podcasts",
-    metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("space_id", Integer, ForeignKey("spaces.id"), nullable=False),
-    Column("transcript", Text), # Changed to Text - also good for transcripts
-    Column("audio_path", String),
-    Column("created_at", DateTime(timezone=True), server_default=func.now())
-)
-
-metadata.create_all(engine)
-
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+from sqlalchemy import create_engine, event, MetaData, Table, Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index # Import Text and Boolean
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.sql import func
+from sqlalchemy.orm import sessionmaker
+
+import config
+
+DATABASE_URL = config.DATABASE_URL
+metadata = MetaData()
+
+spaces_table = Table(
+    "spaces",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    # Chunking used when ingesting this space; NULL means DEFAULT_CHUNK_SIZE / DEFAULT_CHUNK_OVERLAP
+    Column("chunk_size", Integer, nullable=True),
+    Column("chunk_overlap", Integer, nullable=True),
+)
+
+documents_table = Table(
+    "documents",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("space_id", Integer, ForeignKey("spaces.id"), nullable=False),
+    Column("title", String, nullable=False),
+    Column("extracted_text", Text),  # Changed to Text
+    Column("uploaded_at", DateTime(timezone=True), server_default=func.now()),
+    Column("is_embedded", Boolean, server_default='0'),
+    # Listing a space and picking its not-yet-embedded documents (ingestion) both filter on these
+    Index("ix_documents_space_id_is_embedded", "space_id", "is_embedded"),
+)
+
+podcasts_table = Table( # Optional
+    "podcasts",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("space_id", Integer, ForeignKey("spaces.id"), nullable=False),
+    Column("transcript", Text), # Changed to Text - also good for transcripts
+    Column("audio_path", String),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    # Latest podcast of a space
+    Index("ix_podcasts_space_id_created_at", "space_id", "created_at"),
+)
+
+
+def _async_url(url):
+    """The async driver for the configured database: aiosqlite for SQLite, asyncpg for Postgres."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+def _engine_options(url):
+    if make_url(url).get_backend_name() == "sqlite":
+        # WAL lets readers run alongside the background jobs' writes; busy_timeout makes a
+        # writer wait for the lock instead of failing with "database is locked"
+        return {"connect_args": {"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": config.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+# Sync engine: migrations and the background job threads (ingestion, uploads, podcasts)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+# Async engine: request handlers, so database calls do not block the event loop
+async_engine = create_async_engine(_async_url(DATABASE_URL), **_engine_options(DATABASE_URL))
+
+if make_url(DATABASE_URL).get_backend_name() == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+metadata.create_all(engine)
+
+from migrations import run_migrations  # noqa: E402  (needs the tables above)
+run_migrations(engine)
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,24 +1,35 @@
-from routers import spaces,upload,ingestion,query,podcast
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-app = FastAPI()
-
-origins = [
-    "http://localhost:3000"
-]
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-app.include_router(spaces.router)
-app.include_router(upload.router)
-app.include_router(ingestion.router)
-app.include_router(query.router)
-app.include_router(podcast.router)
-app.mount("/podcasts", StaticFiles(directory="podcasts"), name="podcasts")
\ No newline at end of file
+from routers import spaces,upload,ingestion,query,podcast,health,metrics
+from services import podcast_audio_generator, resources
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+app = FastAPI()
+
+origins = [
+    "http://localhost:3000"
+]
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+app.include_router(spaces.router)
+app.include_router(upload.router)
+app.include_router(ingestion.router)
+app.include_router(query.router)
+app.include_router(podcast.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
+# Podcast audio is served by routers/podcast.py (with HTTP range support)
+
+
+@app.on_event("startup")
+async def warm_up_models():
+    # Models load in the background: the server accepts requests right away and /readyz
+    # reports ready once they are loaded
+    resources.start_warmup()
+    # Reports a missing ffmpeg now rather than at the first podcast
+    podcast_audio_generator.resolve_audio_format()
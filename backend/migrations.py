@@ -0,0 +1,56 @@
+"""
+Schema migrations for databases created before a change to database.py.
+
+metadata.create_all only creates missing tables, so indexes and columns added to existing
+tables are applied here. Each migration runs once, in order, and is recorded in the
+schema_migrations table. Steps are SQL statements written to work on both SQLite and
+Postgres, or callables taking the connection for changes SQL cannot make conditionally.
+"""
+from sqlalchemy import inspect, text
+
+
+def _add_column(table: str, column: str, ddl_type: str):
+    """ADD COLUMN unless the column exists (new databases get it from create_all)."""
+    def step(conn):
+        if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return step
+
+
+MIGRATIONS = [
+    ("0001_composite_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_documents_space_id_is_embedded ON documents (space_id, is_embedded)",
+        "CREATE INDEX IF NOT EXISTS ix_podcasts_space_id_created_at ON podcasts (space_id, created_at)",
+    ]),
+    ("0002_space_chunking", [
+        _add_column("spaces", "chunk_size", "INTEGER"),
+        _add_column("spaces", "chunk_overlap", "INTEGER"),
+    ]),
+]
+
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " name VARCHAR PRIMARY KEY,"
+            " applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT name FROM schema_migrations"))}
+
+    for name, statements in MIGRATIONS:
+        if name in applied:
+            continue
+        with engine.begin() as conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+        print(f"Applied migration {name}")
+
+
+if __name__ == "__main__":
+    # python migrations.py: apply pending migrations without starting the API
+    import database  # noqa: F401  (importing it runs the migrations)
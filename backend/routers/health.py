@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+import time
+import config
+from services import resources
+
+router = APIRouter()
+
+STARTED_AT = time.time()
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up. Also reports which models are loaded and their load times."""
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - STARTED_AT, 3),
+        "models": resources.statuses(),
+    }
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness: 200 once every WARMUP_MODELS resource has loaded, 503 until then
+    (or if one failed to load), so traffic is only routed to warm replicas.
+    """
+    ready = resources.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "warming_up",
+            "warmup_models": config.WARMUP_MODELS,
+            "models": resources.statuses(),
+        },
+    )
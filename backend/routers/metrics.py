@@ -0,0 +1,70 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from services import metrics, resources
+from services.content_cache import content_cache
+from services.index_cache import index_cache
+from services.ingestion_jobs import ingestion_queue
+from services.podcast_jobs import podcast_queue
+from services.podcast_pipeline import stage_cache
+from services.response_cache import response_cache
+from services.upload_jobs import upload_queue
+
+router = APIRouter()
+
+QUEUES = {"ingestion": ingestion_queue, "upload": upload_queue, "podcast": podcast_queue}
+
+
+def _collect():
+    """Values other components already keep, read at scrape time so their hot paths pay nothing."""
+    response_stats = response_cache.stats()
+    index_stats = index_cache.stats()
+    content_stats = content_cache.stats()
+    cache_samples = [
+        (("response", "hit"), response_stats["hits"]),
+        (("response", "miss"), response_stats["misses"]),
+        (("index", "hit"), index_stats["hits"]),
+        (("index", "miss"), index_stats["misses"]),
+        (("conversion", "hit"), content_stats["conversion_hits"]),
+        (("conversion", "miss"), content_stats["conversion_misses"]),
+        (("embedding", "hit"), content_stats["embedding_hits"]),
+        (("embedding", "miss"), content_stats["embedding_misses"]),
+        (("podcast_stage", "hit"), stage_cache.hits),
+        (("podcast_stage", "miss"), stage_cache.misses),
+    ]
+
+    lines = metrics.gauge_lines(
+        "memorize_job_queue_depth",
+        "Jobs waiting to start, per queue.",
+        [((name,), queue.depth()) for name, queue in QUEUES.items()],
+        label_names=("queue",),
+    )
+    lines += metrics.gauge_lines(
+        "memorize_jobs_running",
+        "Jobs currently running, per queue.",
+        [((name,), sum(1 for job in queue.list() if job.status == "running")) for name, queue in QUEUES.items()],
+        label_names=("queue",),
+    )
+    lines += metrics.gauge_lines(
+        "memorize_index_cache_bytes",
+        "Estimated size of the space indexes held in memory.",
+        [((), index_stats["size_bytes"])],
+    )
+    lines += metrics.gauge_lines(
+        "memorize_model_loaded",
+        "Whether each lazily loaded model is loaded (1) or not (0).",
+        [((name,), int(status["loaded"])) for name, status in sorted(resources.statuses().items())],
+        label_names=("model",),
+    )
+    return metrics.render(lines, cache_samples=cache_samples)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus text exposition: sampled per-stage latency histograms, cache hit/miss and
+    LLM token counters, job queue depths and model status.
+    """
+    # The content cache stats query SQLite, so stay off the event loop
+    body = await run_in_threadpool(_collect)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
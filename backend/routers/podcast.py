@@ -1,170 +1,169 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-import os
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
-from database import get_db, documents_table
-from services import podcast_audio_generator
-from database import podcasts_table
-from sqlalchemy import desc
-
-load_dotenv()
-
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-client = genai.Client(api_key=GOOGLE_API_KEY)
-
-router = APIRouter()
-sys_instruct = "You are an expert podcast scriptwriter. You create structured, engaging, and well-organized podcast outlines."
-
-
-@router.post("/createpodcast/{space_id}")
-async def podcastGen(space_id: str, focus_topic: str = None, db: Session = Depends(get_db)):
-    query = db.query(documents_table.c.extracted_text).filter(documents_table.c.space_id == space_id)
-    extracted_texts = query.all()
-    extracted_texts = [text[0] for text in query.all() if text[0] is not None]
-    all_texts = " ".join(extracted_texts)
-
-    preprocessed_text = None
-    if focus_topic:
-        print('Preprocessing process started')
-        preprocessing = client.models.generate_content(
-            model="gemini-2.0-flash",
-            
-                contents=[
-                    f"""Extract all text relevant to the topic {focus_topic} from the provided textbook content. Ensure completeness by including definitions, explanations, and discussions directly related to the topic. Additionally, include context buffers (adjacent paragraphs) to maintain coherence and avoid missing critical information"""
-                    f"{all_texts}"
-                
-                ]
-        )
-
-        preprocessed_text = preprocessing.text
-        print('Preprocessing process completed')
-    preprocessed_text = all_texts
-    # outlinegenereration
-    print('Outline Generation started')
-    outline_response = client.models.generate_content(
-    model="gemini-2.0-flash",
-    config=types.GenerateContentConfig(system_instruction=sys_instruct),
-    contents=[
-        f"Generate a structured podcast outline using the provided chapter text. "
-        "Each section should be summarized in one or two sentences max."
-        "Organize it into these sections:\n"
-        "1. Introduction (Engage the audience, introduce key ideas)\n"
-        "2. Key Concepts (Break down important definitions, theories, or principles)\n"
-        "3. Debates & Challenges (Discuss common controversies or misunderstandings)\n"
-        "4. Applications & Real-World Examples (How is this knowledge used?)\n"
-        "5. Conclusion (Summarize takeaways, future perspectives, and open questions)\n\n"
-        f"Chapter Text:\n{preprocessed_text}"
-    ]
-)
-    print('Outline Generation completed')
-    # print(outline_response.text)
-
-    # rolebasedsummarization
-    print("Role based summarization started")
-    rolebasedSummarization_response= client.models.generate_content(
-    model="gemini-2.0-flash",
-    config=types.GenerateContentConfig(system_instruction=sys_instruct),
-    contents=[
-        "Generate two summaries for the given text"
-        "expert Level:"
-        "Summarize the given chapter text as if you are explaining it to an advanced scholar or researcher in this field. Include"
-        "Technical terminology & in-depth analysis"
-        "Key theories,models"
-        "cross references to similar topics os historical developlments"
-        "challenges,contradictions,and nuances"
-        "novice level:"
-        "summarize the given chapter text in a way that a beginner with no background knowledge can understand use:"
-        "simple language and analogies"
-        "examples form everyday life"
-        "common misconceptions and how to clarify them"
-        "engaging questions to spark curiosity"
-        f"Chapter Text:\n{preprocessed_text}"
-
-    ]   
-)
-    print("Role based summarization completed")
-
-    # Diaglougegeneration
-    print("Dialouge generation started")
-    dialogue_generated = client.models.generate_content(
-    model="gemini-2.0-flash",
-    config=types.GenerateContentConfig(system_instruction="Generate a 10-minute podcast dialogue (≈1500 words) between two AI personas. Format: [Speaker]: [Dialogue line]. No markdown, no scene descriptions, only natural conversation. "),
-    contents=[
-        "Create a podcast dialogue between two AI personas"
-        "AI 1(expert):A professor-level speaker who explains with deep knowledge"
-        "AI 2 (Novice): A curious learner who asks simple but thought provoking questions"
-        "use the outline below to structure the conversation. the expert should explain using the expert summary, while the novice should challenge ideas ask for examples or request simpler explanations using the novice summary"
-        "maintain a natural, engaging,and dynamic conversation style. The Expert should respond patiently and adjust explanations when needed"
-        f"here is the outline{outline_response}"
-        f"here is the role based summaries of expert and novice{rolebasedSummarization_response}"
-        "the response should be json [{'speaker':'expert','text':'dialogues'},{'speaker':'novice','text':'dialogues'}] and continue"
-    ]
-)
-    print("Dialouge generation completed")
-    clean_json = dialogue_generated.text.replace("```json", "").replace("```", "").strip()
-    audio_path = podcast_audio_generator.generate_podcast_audio(
-        clean_json,
-        space_id  # Add this parameter
-    )
-    if not audio_path:
-        raise HTTPException(status_code=500, detail="Audio generation failed")
-    audio_url = f"/podcasts/space_{space_id}/{os.path.basename(audio_path)}"
-
-    podcast_data = {
-    "space_id": space_id,
-    "transcript": dialogue_generated.text,
-    "audio_path": f"space_{space_id}/{os.path.basename(audio_path)}"
-}
-    
-    try:
-        db.execute(podcasts_table.insert().values(podcast_data))
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail="Database error")
-    # print(preprocessed_text)
-    return {
-    "status": "success",
-    "data": {
-        "space_id": space_id,
-        "audio_url": audio_url,
-        "transcript": dialogue_generated.text,
-        
-    }
-}
-
-@router.get("/podcast/{space_id}")
-async def get_latest_podcast(space_id: str, db: Session = Depends(get_db)):
-    """
-    Get the most recent podcast audio URL and transcript for a specific space ID.
-    """
-    try:
-        # Query the most recent podcast for the given space_id
-        latest_podcast = db.query(
-            podcasts_table
-        ).filter(
-            podcasts_table.c.space_id == space_id
-        ).order_by(
-            desc(podcasts_table.c.created_at)
-        ).first()
-        
-        if not latest_podcast:
-            return {
-                "status": "success",
-                "data": None,
-                "message": "No podcasts found for this space"
-            }
-        
-        # Return only the audio_url and transcript
-        return {
-            "status": "success",
-            "data": {
-                "audio_url": f"/podcasts/{latest_podcast.audio_path}",
-                "transcript": latest_podcast.transcript
-            }
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving podcast: {str(e)}")
\ No newline at end of file
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
+import os
+import re
+from database import get_db
+from services.podcast_audio_generator import PODCASTS_FOLDER
+from services.podcast_jobs import podcast_queue, submit_podcast
+from database import podcasts_table
+from sqlalchemy import desc, select
+
+router = APIRouter()
+
+AUDIO_MEDIA_TYPES = {".opus": "audio/ogg", ".mp3": "audio/mpeg", ".wav": "audio/wav"}
+RANGE_CHUNK_BYTES = 64 * 1024
+JOB_EVENTS_POLL_SECONDS = 0.5
+
+
+@router.post("/createpodcast/{space_id}", status_code=202)
+async def podcastGen(space_id: int, focus_topic: str = None, use_cache: bool = True):
+    """
+    Queues podcast generation for a space and returns right away. Follow the job through
+    GET /podcast/jobs/{job_id} (polling) or GET /podcast/jobs/{job_id}/events (SSE); the
+    finished job's result holds the audio_url and transcript.
+    """
+    job = submit_podcast(space_id, focus_topic, use_cache)
+    return {
+        "status": "queued",
+        "data": {
+            "space_id": space_id,
+            "job_id": job.id,
+        }
+    }
+
+@router.get("/podcast/jobs/{job_id}")
+async def get_podcast_job(job_id: str):
+    """Status, current stage and TTS progress of a podcast job."""
+    job = podcast_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Podcast job '{job_id}' not found")
+    return job.to_dict()
+
+@router.get("/podcast/jobs/{job_id}/events")
+async def podcast_job_events(job_id: str):
+    """
+    Server-Sent Events stream of a podcast job: a 'progress' event whenever its stage or
+    progress changes, then one 'done' event with the final job state.
+    """
+    job = podcast_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Podcast job '{job_id}' not found")
+
+    async def event_stream():
+        last = None
+        while not job.is_finished:
+            state = {"status": job.status, "progress": dict(job.progress)}
+            if state != last:
+                yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+                last = state
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+        yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/podcast/{space_id}")
+async def get_latest_podcast(space_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Get the most recent podcast audio URL and transcript for a specific space ID,
+    along with the latest generation job for the space, if any.
+    """
+    jobs = podcast_queue.list(key=space_id)
+    latest_job = jobs[-1].to_dict() if jobs else None
+    try:
+        # Query the most recent podcast for the given space_id
+        latest_podcast = (await db.execute(
+            select(podcasts_table).where(
+                podcasts_table.c.space_id == space_id
+            ).order_by(
+                desc(podcasts_table.c.created_at)
+            ).limit(1)
+        )).first()
+
+        if not latest_podcast:
+            return {
+                "status": "success",
+                "data": None,
+                "job": latest_job,
+                "message": "No podcasts found for this space"
+            }
+
+        # Return only the audio_url and transcript
+        return {
+            "status": "success",
+            "data": {
+                "audio_url": f"/podcasts/{latest_podcast.audio_path}",
+                "transcript": latest_podcast.transcript
+            },
+            "job": latest_job,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving podcast: {str(e)}")
+
+def _parse_range(range_header: str, file_size: int):
+    """Parses a single 'bytes=start-end' range. Returns (start, end) inclusive, or None if unsatisfiable."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else file_size - 1
+    else:  # Suffix range: the last N bytes
+        start = max(0, file_size - int(match.group(2)))
+        end = file_size - 1
+    end = min(end, file_size - 1)
+    if start > end:
+        return None
+    return start, end
+
+@router.get("/podcasts/{space_folder}/{filename}")
+async def serve_podcast_audio(space_folder: str, filename: str, request: Request):
+    """
+    Serves podcast audio with HTTP range support, so players can seek and start
+    playing without downloading the whole file.
+    """
+    extension = os.path.splitext(filename)[1]
+    if not re.fullmatch(r"space_\d+", space_folder) or os.path.basename(filename) != filename or extension not in AUDIO_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Podcast not found")
+    path = os.path.join(PODCASTS_FOLDER, space_folder, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Podcast not found")
+
+    media_type = AUDIO_MEDIA_TYPES[extension]
+    range_header = request.headers.get("range")
+    if not range_header:
+        return FileResponse(path, media_type=media_type, headers={"Accept-Ranges": "bytes"})
+
+    file_size = os.path.getsize(path)
+    byte_range = _parse_range(range_header, file_size)
+    if byte_range is None:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+    start, end = byte_range
+
+    def read_range():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(RANGE_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(
+        read_range(),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1),
+        },
+    )
@@ -1,51 +1,277 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from services import embedding_service
-from llama_index.core import Settings
-from llama_index.llms.gemini import Gemini
-from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.core.retrievers import QueryFusionRetriever
-from llama_index.retrievers.bm25 import BM25Retriever
-import Stemmer
-import nest_asyncio
-
-
-
-import os
-from dotenv import load_dotenv
-load_dotenv()
-
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-Settings.llm = Gemini(model="models/gemini-1.5-flash")
-router = APIRouter()
-
-class QueryRequest(BaseModel):
-    query_text: str
-
-@router.post("/query/{space_id}")
-async def query_space(space_id: str, request: QueryRequest):  # Expect request body as Pydantic model
-    try:
-        # Convert space_id to integer if needed by the embedding_service
-        index,bm25_retriever = embedding_service.load_index_for_space(int(space_id))
-        retriever = QueryFusionRetriever(
-            [
-                index.as_retriever(similarity_top_k=5),
-                bm25_retriever
-            ],
-            similarity_top_k=2,
-            num_queries=1,
-            mode="reciprocal_rerank",
-            use_async=True,
-            verbose=True,)
-        nest_asyncio.apply()
-        # query_engine = index.as_query_engine()
-        query_engine = RetrieverQueryEngine.from_args(retriever)
-        response = query_engine.query(request.query_text)
-        print(response)
-        return {"response": str(response)}
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error querying space '{space_id}': {str(e)}"
-        )
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List
+from services import embedding_service, retrieval
+from services.embedding_backends import embed_query_batch
+from services.index_cache import index_cache
+from services.llm_service import get_llm
+from services.response_cache import response_cache
+import config
+from llama_index.core import QueryBundle
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.response_synthesizers import get_response_synthesizer
+import json
+import time
+
+
+# The embedding model and LLM are loaded on first use (or by the startup warm-up), not at import
+router = APIRouter()
+
+class TopKParams(BaseModel):
+    vector_top_k: int = Field(config.QUERY_VECTOR_TOP_K, ge=1, le=100)
+    bm25_top_k: int = Field(config.QUERY_BM25_TOP_K, ge=1, le=100)
+    top_k: int = Field(config.QUERY_TOP_K, ge=1, le=100)  # After fusing the vector and BM25 results
+
+    def is_default(self) -> bool:
+        return (self.vector_top_k, self.bm25_top_k, self.top_k) == (
+            config.QUERY_VECTOR_TOP_K, config.QUERY_BM25_TOP_K, config.QUERY_TOP_K
+        )
+
+class QueryRequest(TopKParams):
+    query_text: str
+
+class RetrieveRequest(TopKParams):
+    query_text: str
+
+class BatchRetrieveRequest(TopKParams):
+    query_texts: List[str]
+
+class MultiSpaceQueryRequest(BaseModel):
+    query_text: str
+    space_ids: List[int]
+    top_k: int = Field(5, ge=1, le=50)  # Global top-k after fusing every space
+
+def _build_query_engine(space_id: int, streaming: bool = False, params: TopKParams = None):
+    params = params or TopKParams()
+    # Vector search and BM25 run concurrently on the hybrid retriever's pool and are fused
+    # with NumPy RRF; the engine's async path (aquery) never blocks the event loop
+    retriever = retrieval.build_hybrid_retriever(space_id, params.vector_top_k, params.bm25_top_k, params.top_k)
+    return RetrieverQueryEngine.from_args(retriever, llm=get_llm(), streaming=streaming)
+
+def _source_dict(node_with_score):
+    return {
+        "node_id": node_with_score.node.node_id,
+        "score": node_with_score.score,
+        "text": node_with_score.node.get_content(),
+        "metadata": node_with_score.node.metadata,
+    }
+
+def _retrieval_result(node_with_score):
+    return {**_source_dict(node_with_score), "document_id": node_with_score.node.metadata.get("source_document_id")}
+
+def _lookup_response_cache(space_id: int, query_text: str, use_cache: bool = True):
+    """
+    Embeds the query once and checks the semantic response cache. Returns the QueryBundle
+    (carrying the embedding, so vector retrieval does not embed the query again), the
+    cached answer, if any, and the space's cache generation to pass to _store_response.
+    """
+    if not (config.RESPONSE_CACHE_ENABLED and use_cache):
+        return QueryBundle(query_text), None, None
+    # Read before anything is retrieved: an ingestion finishing after this point makes the answer stale
+    generation = response_cache.generation(space_id)
+    query_embedding = embedding_service.get_embed_model().get_query_embedding(query_text)
+    query_bundle = QueryBundle(query_text, embedding=query_embedding)
+    return query_bundle, response_cache.lookup(space_id, query_embedding), generation
+
+def _store_response(space_id: int, query_bundle: QueryBundle, response_text: str, source_nodes, generation: int):
+    # Bundles from _lookup_response_cache only carry an embedding when caching applies
+    if config.RESPONSE_CACHE_ENABLED and query_bundle.embedding is not None:
+        response_cache.store(
+            space_id,
+            query_bundle.query_str,
+            query_bundle.embedding,
+            response_text,
+            sources=[_source_dict(node) for node in source_nodes],
+            generation=generation,
+        )
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@router.post("/query")
+async def query_spaces(request: MultiSpaceQueryRequest):
+    """
+    Answers a question across several spaces: retrieval fans out over the spaces in parallel,
+    all results are fused by reciprocal rank under one global top_k, and a single LLM call
+    answers from the fused chunks. Per-space retrieval latency (and errors) are reported in
+    'spaces'; a failing space does not fail the whole query.
+    """
+    space_ids = list(dict.fromkeys(request.space_ids))
+    if not space_ids:
+        raise HTTPException(status_code=400, detail="space_ids must not be empty")
+    if len(space_ids) > config.MULTI_SPACE_MAX_SPACES:
+        raise HTTPException(status_code=400, detail=f"At most {config.MULTI_SPACE_MAX_SPACES} spaces can be queried at once")
+
+    def retrieve():
+        # One query embedding shared by every space
+        query_bundle = QueryBundle(request.query_text, embedding=embedding_service.get_embed_model().get_query_embedding(request.query_text))
+        start = time.perf_counter()
+        source_nodes, spaces = retrieval.retrieve_across_spaces(space_ids, query_bundle, top_k=request.top_k)
+        return query_bundle, source_nodes, spaces, time.perf_counter() - start
+
+    try:
+        query_bundle, source_nodes, spaces, retrieval_seconds = await run_in_threadpool(retrieve)
+        if not source_nodes:
+            raise HTTPException(status_code=404, detail="No results in the selected spaces")
+        response = await run_in_threadpool(get_response_synthesizer(llm=get_llm()).synthesize, query_bundle, source_nodes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error querying spaces {space_ids}: {str(e)}"
+        )
+
+    return {
+        "response": str(response),
+        "sources": [
+            {**_source_dict(node), "space_id": node.node.metadata.get("space_id")}
+            for node in source_nodes
+        ],
+        "spaces": spaces,
+        "retrieval_ms": round(retrieval_seconds * 1000, 2),
+    }
+
+@router.post("/query/{space_id}")
+async def query_space(space_id: str, request: QueryRequest):  # Expect request body as Pydantic model
+    try:
+        # Convert space_id to integer if needed by the embedding_service
+        # Cached answers were produced with the default top-k, so only those requests share them
+        query_bundle, cached, generation = await run_in_threadpool(
+            _lookup_response_cache, int(space_id), request.query_text, use_cache=request.is_default()
+        )
+        if cached:
+            return {"response": cached["response"], "cached": True}
+
+        # Loading a space that is not cached yet reads from disk, so it stays off the event loop too
+        query_engine = await run_in_threadpool(_build_query_engine, int(space_id), params=request)
+        response = await query_engine.aquery(query_bundle)
+        _store_response(int(space_id), query_bundle, str(response), response.source_nodes, generation)
+        return {"response": str(response)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error querying space '{space_id}': {str(e)}"
+        )
+
+@router.post("/query/{space_id}/stream")
+async def query_space_stream(space_id: str, request: QueryRequest):
+    """
+    Server-Sent Events variant of /query/{space_id}. Emits one 'sources' event with the
+    retrieved chunks, then a 'token' event per LLM token, then 'done' with the full
+    response ('error' if something fails after the stream has started).
+    """
+    try:
+        query_bundle, cached, generation = await run_in_threadpool(
+            _lookup_response_cache, int(space_id), request.query_text, use_cache=request.is_default()
+        )
+        query_engine = None if cached else await run_in_threadpool(
+            _build_query_engine, int(space_id), streaming=True, params=request
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error querying space '{space_id}': {str(e)}"
+        )
+
+    # A plain generator: StreamingResponse iterates it in a worker thread, so neither
+    # retrieval nor generation blocks the event loop
+    def event_stream():
+        try:
+            if cached:
+                yield _sse("sources", {"sources": cached["sources"]})
+                yield _sse("token", {"token": cached["response"]})
+                yield _sse("done", {"response": cached["response"], "cached": True})
+                return
+
+            source_nodes = query_engine.retrieve(query_bundle)
+            yield _sse("sources", {"sources": [_source_dict(node) for node in source_nodes]})
+
+            response = query_engine.synthesize(query_bundle, source_nodes)
+            tokens = []
+            for token in response.response_gen:
+                tokens.append(token)
+                yield _sse("token", {"token": token})
+            yield _sse("done", {"response": "".join(tokens)})
+            _store_response(int(space_id), query_bundle, "".join(tokens), source_nodes, generation)
+        except Exception as e:
+            yield _sse("error", {"detail": f"Error querying space '{space_id}': {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _retrieve_fused(space_id: int, query_bundle: QueryBundle, params: TopKParams):
+    retriever = retrieval.build_hybrid_retriever(space_id, params.vector_top_k, params.bm25_top_k, params.top_k)
+    return retriever.retrieve(query_bundle)
+
+@router.post("/retrieve/{space_id}")
+async def retrieve_space(space_id: int, request: RetrieveRequest):
+    """
+    Retrieval only, no LLM call: the vector and BM25 results of the space fused by reciprocal
+    rank, with their scores and source document ids.
+    """
+    def retrieve():
+        start = time.perf_counter()
+        query_bundle = QueryBundle(request.query_text, embedding=embedding_service.get_embed_model().get_query_embedding(request.query_text))
+        results = _retrieve_fused(space_id, query_bundle, request)
+        return results, time.perf_counter() - start
+
+    try:
+        results, elapsed = await run_in_threadpool(retrieve)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving from space '{space_id}': {str(e)}")
+    return {
+        "space_id": space_id,
+        "results": [_retrieval_result(result) for result in results],
+        "retrieval_ms": round(elapsed * 1000, 2),
+    }
+
+@router.post("/retrieve/{space_id}/batch")
+async def retrieve_space_batch(space_id: int, request: BatchRetrieveRequest):
+    """
+    Retrieval for many queries at once: all query texts are embedded in one batched model
+    call and retrieved against the same loaded index. Results are in request order.
+    """
+    if not request.query_texts:
+        raise HTTPException(status_code=400, detail="query_texts must not be empty")
+    if len(request.query_texts) > config.RETRIEVE_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {config.RETRIEVE_BATCH_MAX_QUERIES} queries per batch")
+
+    def retrieve():
+        start = time.perf_counter()
+        embeddings = embed_query_batch(embedding_service.get_embed_model(), request.query_texts)
+        embedded = time.perf_counter()
+        batch_results = [
+            _retrieve_fused(space_id, QueryBundle(query_text, embedding=embedding), request)
+            for query_text, embedding in zip(request.query_texts, embeddings)
+        ]
+        return batch_results, embedded - start, time.perf_counter() - start
+
+    try:
+        batch_results, embedding_seconds, elapsed = await run_in_threadpool(retrieve)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving from space '{space_id}': {str(e)}")
+    return {
+        "space_id": space_id,
+        "results": [
+            {"query_text": query_text, "results": [_retrieval_result(result) for result in results]}
+            for query_text, results in zip(request.query_texts, batch_results)
+        ],
+        "embedding_ms": round(embedding_seconds * 1000, 2),
+        "retrieval_ms": round(elapsed * 1000, 2),
+    }
+
+@router.get("/query/cache/stats")
+async def query_cache_stats():
+    """Hit/miss counters and current contents of the loaded space index cache."""
+    return index_cache.stats()
+
+@router.get("/query/response-cache/stats")
+async def response_cache_stats():
+    """Hit rate and size of the semantic response cache."""
+    return response_cache.stats()
@@ -1,75 +1,161 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy import insert, select
-from sqlalchemy.orm import Session
-from database import get_db, spaces_table,documents_table
-import os
-
-router = APIRouter()
-
-SPACES_FOLDER = "spaces"
-
-@router.post("/createspace/")
-async def create_space(space_name: str = Query(..., title="Space Name"), db: Session = Depends(get_db)):
-    """Creates a new space with a given name and folder."""
-    if not space_name:
-        raise HTTPException(status_code=400, detail="Space name required")
-
-    insert_stmt = insert(spaces_table).values(name=space_name)
-    result = db.execute(insert_stmt)
-    db.commit()
-    space_id = result.inserted_primary_key[0]
-
-    space_folder_path = os.path.join(SPACES_FOLDER, f"Space_{space_id}")
-    os.makedirs(space_folder_path, exist_ok=True)
-
-    return {"message": "Space created", "space_id": space_id, "space_name": space_name}
-
-@router.get("/spaces/")
-async def list_spaces(db: Session = Depends(get_db)):
-    """Lists all available spaces."""
-    select_stmt = select(spaces_table) # Select all rows from spaces_table
-    result = db.execute(select_stmt)
-    spaces = result.fetchall() # Fetch all results
-
-    # Convert SQLAlchemy results to a list of dictionaries for JSON response
-    space_list = []
-    for space in spaces:
-        space_list.append({
-            "space_id": space.id, # Assuming 'id' is the column name for space ID
-            "space_name": space.name # Assuming 'name' is the column name for space name
-        })
-
-    return {"spaces": space_list} # Return spaces in a dictionary
-
-@router.get("/spaces/{space_id}/documents")
-async def get_space_documents(space_id: int, db: Session = Depends(get_db)):
-    """
-    Get the list of document names and space name for a specific space.
-    
-    Args:
-        space_id (int): The ID of the space to retrieve documents for.
-        db (Session): Database session dependency.
-    
-    Returns:
-        A JSON response containing the space name, space ID, and list of document names.
-    """
-    # Check if the space exists and get its name
-    space_query = db.query(spaces_table.c.id, spaces_table.c.name).filter(spaces_table.c.id == space_id).first()
-    if not space_query:
-        raise HTTPException(status_code=404, detail=f"Space with ID {space_id} not found")
-
-    space_name = space_query[1]  # Extract the space name from the query result
-
-    # Query the documents_table for all documents with the given space_id
-    query = db.query(documents_table.c.title).filter(documents_table.c.space_id == space_id)
-    documents = query.all()
-
-    # Extract just the titles from the result
-    document_names = [doc[0] for doc in documents]
-
-    # Return the space name, space ID, and list of document names
-    return {
-        "space_id": space_id,
-        "space_name": space_name,
-        "documents": document_names
+from fastapi import APIRouter, HTTPException, Depends, Query
+import asyncio
+from sqlalchemy import insert, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, spaces_table,documents_table
+import config
+from services.ingestion_jobs import submit_document_delete, submit_reindex
+import os
+
+router = APIRouter()
+
+SPACES_FOLDER = "spaces"
+
+def _validate_chunking(chunk_size, chunk_overlap):
+    size = chunk_size or config.DEFAULT_CHUNK_SIZE
+    overlap = config.DEFAULT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    if overlap >= size:
+        raise HTTPException(status_code=400, detail=f"chunk_overlap ({overlap}) must be smaller than chunk_size ({size})")
+
+@router.post("/createspace/")
+async def create_space(
+    space_name: str = Query(..., title="Space Name"),
+    chunk_size: int = Query(None, ge=32, le=8192, description="Tokens per chunk (default DEFAULT_CHUNK_SIZE)"),
+    chunk_overlap: int = Query(None, ge=0, le=4096, description="Token overlap between chunks (default DEFAULT_CHUNK_OVERLAP)"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Creates a new space with a given name and folder, optionally with its own chunking."""
+    if not space_name:
+        raise HTTPException(status_code=400, detail="Space name required")
+    _validate_chunking(chunk_size, chunk_overlap)
+
+    insert_stmt = insert(spaces_table).values(name=space_name, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    result = await db.execute(insert_stmt)
+    await db.commit()
+    space_id = result.inserted_primary_key[0]
+
+    space_folder_path = os.path.join(SPACES_FOLDER, f"Space_{space_id}")
+    os.makedirs(space_folder_path, exist_ok=True)
+
+    return {"message": "Space created", "space_id": space_id, "space_name": space_name}
+
+@router.get("/spaces/")
+async def list_spaces(db: AsyncSession = Depends(get_db)):
+    """Lists all available spaces."""
+    select_stmt = select(spaces_table) # Select all rows from spaces_table
+    result = await db.execute(select_stmt)
+    spaces = result.fetchall() # Fetch all results
+
+    # Convert SQLAlchemy results to a list of dictionaries for JSON response
+    space_list = []
+    for space in spaces:
+        space_list.append({
+            "space_id": space.id, # Assuming 'id' is the column name for space ID
+            "space_name": space.name # Assuming 'name' is the column name for space name
+        })
+
+    return {"spaces": space_list} # Return spaces in a dictionary
+
+@router.put("/spaces/{space_id}/chunking")
+async def update_space_chunking(
+    space_id: int,
+    chunk_size: int = Query(None, ge=32, le=8192),
+    chunk_overlap: int = Query(None, ge=0, le=4096),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Sets the chunk size and overlap used for documents ingested into this space from now on
+    (omit a value to use the default). Documents already embedded keep their chunks until
+    they are replaced.
+    """
+    _validate_chunking(chunk_size, chunk_overlap)
+    result = await db.execute(
+        spaces_table.update().where(spaces_table.c.id == space_id)
+        .values(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    )
+    await db.commit()
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail=f"Space with ID {space_id} not found")
+    return {
+        "space_id": space_id,
+        "chunk_size": chunk_size or config.DEFAULT_CHUNK_SIZE,
+        "chunk_overlap": config.DEFAULT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+    }
+
+@router.get("/spaces/{space_id}/documents")
+async def get_space_documents(space_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Get the list of document names and space name for a specific space.
+    
+    Args:
+        space_id (int): The ID of the space to retrieve documents for.
+        db (AsyncSession): Database session dependency.
+    
+    Returns:
+        A JSON response containing the space name, space ID, and list of document names.
+    """
+    # Check if the space exists and get its name
+    space_query = (await db.execute(
+        select(spaces_table.c.id, spaces_table.c.name).where(spaces_table.c.id == space_id)
+    )).first()
+    if not space_query:
+        raise HTTPException(status_code=404, detail=f"Space with ID {space_id} not found")
+
+    space_name = space_query[1]  # Extract the space name from the query result
+
+    # Query the documents_table for all documents with the given space_id
+    query = select(documents_table.c.id, documents_table.c.title, documents_table.c.is_embedded).where(documents_table.c.space_id == space_id)
+    documents = (await db.execute(query)).all()
+
+    # Extract just the titles from the result
+    document_names = [doc[1] for doc in documents]
+
+    # Return the space name, space ID, and list of document names (with ids, for delete/replace)
+    return {
+        "space_id": space_id,
+        "space_name": space_name,
+        "documents": document_names,
+        "document_list": [
+            {"document_id": doc[0], "title": doc[1], "is_embedded": bool(doc[2])}
+            for doc in documents
+        ],
+    }
+
+@router.delete("/spaces/{space_id}/documents/{document_id}")
+async def delete_space_document(space_id: int, document_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Deletes a document and removes only its vectors, docstore nodes and BM25 entries
+    from the space index. Spaces indexed before nodes carried document ids cannot be
+    pruned per document; for those a full re-index is queued (reindex_job_id).
+    The nodes are removed by a job in the space's ingestion queue, after any ingestion
+    already queued for the space.
+    """
+    document = (await db.execute(
+        select(documents_table.c.id, documents_table.c.is_embedded, documents_table.c.extracted_text).where(
+            (documents_table.c.id == document_id) & (documents_table.c.space_id == space_id)
+        )
+    )).fetchone()
+    if not document:
+        raise HTTPException(status_code=404, detail=f"Document with id '{document_id}' not found in space {space_id}")
+
+    # Waits for the space's ingestion slot, so it never interleaves with an ingestion or reindex
+    job = submit_document_delete(space_id, document_id)
+    await asyncio.wrap_future(job.future)
+    if job.status != "completed":
+        raise HTTPException(status_code=500, detail=job.error or f"Document delete {job.status}")
+    nodes_removed = job.result["nodes_removed"]
+
+    await db.execute(delete(documents_table).where(documents_table.c.id == document_id))
+    await db.commit()
+
+    reindex_job = None
+    if document.is_embedded and document.extracted_text and not nodes_removed:
+        reindex_job = submit_reindex(space_id)
+
+    return {
+        "message": "Document deleted",
+        "space_id": space_id,
+        "document_id": document_id,
+        "nodes_removed": nodes_removed,
+        "reindex_job_id": reindex_job.id if reindex_job else None,
     }
\ No newline at end of file
@@ -1,55 +1,141 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
-from sqlalchemy import insert, select
-from sqlalchemy.orm import Session
-import os
-from database import get_db, documents_table, spaces_table
-# from llama_index.readers.docling import DoclingReader
-from docling.document_converter import DocumentConverter
-
-router = APIRouter()
-
-converter = DocumentConverter()
-SPACES_FOLDER = "spaces"
-
-@router.post("/upload/")
-async def upload_file(
-    space_id: int, files: list[UploadFile] = File(...), db: Session = Depends(get_db)
-):
-    """Uploads documents to the respective space, extracts text, and saves in DB."""
-    
-    # Check if space_id exists
-    space_check = db.execute(spaces_table.select().where(spaces_table.c.id == space_id)).fetchone()
-    if not space_check:
-        raise HTTPException(status_code=404, detail="Space not found")
-
-    space_folder = os.path.join(SPACES_FOLDER, f"Space_{space_id}")
-    os.makedirs(space_folder, exist_ok=True)
-
-    stored_files = []
-    
-    for file in files:
-        file_path = os.path.join(space_folder, file.filename)
-        
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
-
-        # Extract text
-        try:
-            result = converter.convert(file_path)
-            extracted_text = result.document.export_to_text()
-        except Exception as e:
-            extracted_text = None  # Handle extraction failure gracefully
-
-        # Insert into DB
-        insert_stmt = insert(documents_table).values(
-            space_id=space_id,
-            title=file.filename,
-            extracted_text=extracted_text
-        )
-        db.execute(insert_stmt)
-        db.commit()
-
-        stored_files.append({"filename": file.filename, "extracted": bool(extracted_text)})
-
-    return {"message": "Files uploaded", "files": stored_files}
\ No newline at end of file
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import hashlib
+import os
+import uuid
+import config
+from database import get_db, documents_table, spaces_table
+from services.upload_jobs import upload_queue, submit_upload
+from services.content_cache import content_cache
+from services import metrics
+
+router = APIRouter()
+
+SPACES_FOLDER = "spaces"
+
+
+def _save_upload(file: UploadFile, space_folder: str):
+    """
+    Streams the upload to disk in UPLOAD_CHUNK_BYTES chunks instead of reading it into memory.
+    The file is written under a unique temporary name and then renamed to its SHA-256 (keeping
+    the extension, which Docling uses to detect the format), so a later upload with the same
+    filename can never change the bytes a queued conversion reads. Returns (file_path, hash);
+    the hash is the conversion cache key.
+    """
+    digest = hashlib.sha256()
+    extension = os.path.splitext(os.path.basename(file.filename or ""))[1].lower()
+    tmp_path = os.path.join(space_folder, f".upload_{uuid.uuid4().hex}.tmp")
+    file.file.seek(0)
+    try:
+        with metrics.span("upload_write", sample_rate=1.0), open(tmp_path, "wb") as f:
+            while chunk := file.file.read(config.UPLOAD_CHUNK_BYTES):
+                digest.update(chunk)
+                f.write(chunk)
+        file_hash = digest.hexdigest()
+        file_path = os.path.join(space_folder, f"{file_hash}{extension}")
+        os.replace(tmp_path, file_path)  # Same name means same bytes, so replacing is harmless
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_path, file_hash
+
+
+@router.post("/upload/")
+async def upload_file(
+    space_id: int,
+    files: list[UploadFile] = File(...),
+    wait: bool = Query(True, description="Wait for text extraction to finish before responding"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Uploads documents to the respective space, extracts text, and saves in DB.
+    With wait=false the response returns as soon as the files are on disk, together with
+    an upload_id whose per-file conversion status can be polled at /upload/status/{upload_id}.
+    """
+
+    # Check if space_id exists
+    space_check = (await db.execute(spaces_table.select().where(spaces_table.c.id == space_id))).fetchone()
+    if not space_check:
+        raise HTTPException(status_code=404, detail="Space not found")
+
+    space_folder = os.path.join(SPACES_FOLDER, f"Space_{space_id}")
+    os.makedirs(space_folder, exist_ok=True)
+
+    saved_files = []
+    for file in files:
+        file_path, file_hash = await run_in_threadpool(_save_upload, file, space_folder)
+        saved_files.append((file.filename, file_path, file_hash))
+
+    # Conversion runs in the Docling process pool; documents are inserted in one transaction at the end
+    job = submit_upload(space_id, saved_files)
+
+    if not wait:
+        return {
+            "message": "Files uploaded, text extraction in progress",
+            "upload_id": job.id,
+            "files": job.progress["files"],
+        }
+
+    await asyncio.wrap_future(job.future)
+    if job.status != "completed":
+        raise HTTPException(status_code=500, detail=f"Error extracting uploaded files: {job.error}")
+
+    return {"message": "Files uploaded", "upload_id": job.id, "files": job.result["files"]}
+
+
+@router.put("/upload/{document_id}")
+async def replace_file(
+    document_id: int,
+    file: UploadFile = File(...),
+    wait: bool = Query(True, description="Wait for text extraction to finish before responding"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Replaces the content of an existing document with a new file. If the old version was
+    embedded, only this document is re-embedded: its previous vectors, docstore nodes and
+    BM25 entries are swapped out by the queued ingestion job (ingestion_job_id in the result).
+    """
+    document = (await db.execute(
+        select(documents_table.c.id, documents_table.c.space_id).where(documents_table.c.id == document_id)
+    )).fetchone()
+    if not document:
+        raise HTTPException(status_code=404, detail=f"Document with id '{document_id}' not found")
+
+    space_folder = os.path.join(SPACES_FOLDER, f"Space_{document.space_id}")
+    os.makedirs(space_folder, exist_ok=True)
+    file_path, file_hash = await run_in_threadpool(_save_upload, file, space_folder)
+
+    job = submit_upload(document.space_id, [(file.filename, file_path, file_hash)], replace_document_id=document_id)
+
+    if not wait:
+        return {
+            "message": "File uploaded, text extraction in progress",
+            "upload_id": job.id,
+            "document_id": document_id,
+            "files": job.progress["files"],
+        }
+
+    await asyncio.wrap_future(job.future)
+    if job.status != "completed":
+        raise HTTPException(status_code=500, detail=f"Error replacing document '{document_id}': {job.error}")
+
+    return {"message": "Document replaced", "upload_id": job.id, **job.result}
+
+
+@router.get("/upload/status/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """Per-file conversion status of an upload started with wait=false."""
+    job = upload_queue.get(upload_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    return job.to_dict()
+
+
+@router.get("/upload/cache/stats")
+async def get_content_cache_stats():
+    """Hit/miss counters and sizes of the conversion and chunk embedding caches."""
+    return content_cache.stats()
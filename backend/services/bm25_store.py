@@ -0,0 +1,173 @@
+import json
+import shutil
+import threading
+from pathlib import Path
+
+import bm25s
+import Stemmer
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from llama_index.retrievers.bm25 import BM25Retriever
+
+import config
+from services.docstore import iter_docstore_nodes
+
+# Same stemmer/stopwords BM25Retriever uses for the query side
+stemmer = Stemmer.Stemmer("english")
+STOPWORDS = "en"
+
+_space_locks = {}
+_space_locks_guard = threading.Lock()
+
+
+def bm25_dir(space_id: int) -> Path:
+    return Path("./index_storage") / f"space_{space_id}" / "bm25"
+
+
+def _space_lock(space_id: int):
+    with _space_locks_guard:
+        return _space_locks.setdefault(space_id, threading.Lock())
+
+
+def update_bm25_index(space_id: int, nodes, docstore=None, rebuild: bool = True):
+    """
+    Adds nodes to the persisted BM25 index of a space.
+
+    Only the new nodes are tokenized and stemmed; their tokens are appended to
+    tokens.jsonl and the nodes to nodes.jsonl. The scoring matrix is then rebuilt
+    from the stored tokens and saved as a new snapshot that can be memory-mapped.
+    If the space predates the persisted index, docstore is used to backfill it once.
+    With rebuild=False only the logs are appended (e.g. per ingestion batch); call
+    rebuild_bm25_index once the last batch is in.
+    """
+    base_dir = bm25_dir(space_id)
+    tokens_path = base_dir / "tokens.jsonl"
+    nodes_path = base_dir / "nodes.jsonl"
+
+    with _space_lock(space_id):
+        if not tokens_path.exists() and docstore is not None:
+            nodes = list(iter_docstore_nodes(docstore))  # Backfill: includes the new nodes already added to the docstore
+        if not nodes:
+            return
+        base_dir.mkdir(parents=True, exist_ok=True)
+
+        new_tokens = bm25s.tokenize(
+            [node.get_content() for node in nodes],
+            stopwords=STOPWORDS,
+            stemmer=stemmer,
+            return_ids=False,
+            show_progress=False,
+        )
+        with open(tokens_path, "a", encoding="utf-8") as f:
+            for tokens in new_tokens:
+                f.write(json.dumps(tokens) + "\n")
+        with open(nodes_path, "a", encoding="utf-8") as f:
+            for node in nodes:
+                f.write(json.dumps(node_to_metadata_dict(node, remove_text=False)) + "\n")
+
+        if rebuild:
+            _rebuild_snapshot(base_dir)
+
+
+def rebuild_bm25_index(space_id: int):
+    """Rebuilds the BM25 snapshot of a space from its token log."""
+    base_dir = bm25_dir(space_id)
+    with _space_lock(space_id):
+        if (base_dir / "tokens.jsonl").exists():
+            _rebuild_snapshot(base_dir)
+
+
+def remove_from_bm25_index(space_id: int, ref_doc_ids) -> int:
+    """
+    Drops every node of the given source documents from the persisted BM25 index of a
+    space and rebuilds the snapshot. Returns the number of nodes removed.
+    """
+    base_dir = bm25_dir(space_id)
+    tokens_path = base_dir / "tokens.jsonl"
+    nodes_path = base_dir / "nodes.jsonl"
+    ref_doc_ids = set(ref_doc_ids)
+
+    with _space_lock(space_id):
+        if not tokens_path.exists():
+            return 0
+        with open(tokens_path, encoding="utf-8") as f:
+            token_lines = f.readlines()
+        with open(nodes_path, encoding="utf-8") as f:
+            node_lines = f.readlines()
+        keep = [i for i, line in enumerate(node_lines) if json.loads(line).get("ref_doc_id") not in ref_doc_ids]
+        removed = len(node_lines) - len(keep)
+        if not removed:
+            return 0
+
+        # Rewrite both logs side by side, then swap them in
+        for path, lines in ((tokens_path, token_lines), (nodes_path, node_lines)):
+            tmp_path = path.with_suffix(".jsonl.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(lines[i] for i in keep)
+            tmp_path.replace(path)
+
+        _rebuild_snapshot(base_dir)
+        return removed
+
+
+def _rebuild_snapshot(base_dir: Path):
+    with open(base_dir / "tokens.jsonl", encoding="utf-8") as f:
+        corpus_tokens = [json.loads(line) for line in f]
+    with open(base_dir / "nodes.jsonl", encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f]
+
+    pointer = base_dir / "current.json"
+    if not corpus_tokens:
+        # Every node was removed: no snapshot, the space reads as empty
+        pointer.unlink(missing_ok=True)
+        for old in base_dir.glob("index_*"):
+            shutil.rmtree(old, ignore_errors=True)
+        return
+
+    bm25 = bm25s.BM25()
+    bm25.index(corpus_tokens, show_progress=False)
+
+    # Snapshots are versioned rather than overwritten, so cached retrievers that still
+    # memory-map the previous one keep working until they are replaced. The version only
+    # increases: after deletions the corpus size alone could repeat an earlier snapshot.
+    version = json.loads(pointer.read_text()).get("version", 0) + 1 if pointer.exists() else 1
+    snapshot_name = f"index_v{version}"
+    snapshot_dir = base_dir / snapshot_name
+    if snapshot_dir.exists():
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+    bm25.save(str(snapshot_dir.as_posix()), corpus=corpus)
+
+    tmp_pointer = base_dir / "current.json.tmp"
+    tmp_pointer.write_text(json.dumps({"snapshot": snapshot_name, "version": version}))
+    tmp_pointer.replace(pointer)
+
+    for old in base_dir.glob("index_*"):
+        if old.name != snapshot_name:
+            shutil.rmtree(old, ignore_errors=True)  # May fail while still mapped (Windows); cleaned up next time
+
+
+def load_bm25_retriever(space_id: int, similarity_top_k: int = 2, docstore=None):
+    """
+    Loads the persisted BM25 index of a space without re-tokenizing the corpus.
+    Returns None if the space has no persisted index and no docstore to build one from.
+    """
+    base_dir = bm25_dir(space_id)
+    pointer = base_dir / "current.json"
+    if not pointer.exists():
+        if docstore is None:
+            return None
+        update_bm25_index(space_id, [], docstore=docstore)
+        if not pointer.exists():
+            return None  # Empty space
+
+    snapshot_name = json.loads(pointer.read_text())["snapshot"]
+    bm25 = bm25s.BM25.load(
+        str((base_dir / snapshot_name).as_posix()),
+        load_corpus=True,
+        mmap=config.BM25_MMAP,
+    )
+    return BM25Retriever(existing_bm25=bm25, stemmer=stemmer, similarity_top_k=similarity_top_k)
+
+
+def with_top_k(bm25_retriever, similarity_top_k: int):
+    """A retriever over the same (already loaded) BM25 index returning a different number of results."""
+    return BM25Retriever(existing_bm25=bm25_retriever.bm25, stemmer=stemmer, similarity_top_k=similarity_top_k)
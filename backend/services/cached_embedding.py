@@ -0,0 +1,65 @@
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from services.content_cache import content_cache, hash_chunk
+from services.embedding_backends import embed_query_batch
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps another embedding model with the content-addressed chunk cache.
+    Document chunks that were embedded before (in any space) are served from the
+    cache; only the misses are sent to the wrapped model, in one batch.
+    Query embeddings are passed straight through.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        return embed_query_batch(self._inner, queries)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._inner.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._inner.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [hash_chunk(self.model_name, text) for text in texts]
+        cached = content_cache.get_embeddings(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            computed = self._inner.get_text_embedding_batch(list(missing.values()))
+            new_embeddings = dict(zip(missing.keys(), computed))
+            content_cache.put_embeddings(new_embeddings)
+            cached.update(new_embeddings)
+
+        return [cached[key] for key in keys]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._get_text_embeddings(texts)
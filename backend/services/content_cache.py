@@ -0,0 +1,145 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+
+
+def hash_chunk(model_name: str, text: str) -> str:
+    """Embedding cache key: the same text embedded by a different model is a different entry."""
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class ContentCache:
+    """
+    Content-addressed caches shared by all spaces, stored in one SQLite file:
+      - conversions: file hash -> Docling extracted text
+      - embeddings:  chunk hash -> embedding vector (float32)
+    Each table is bounded in bytes and evicted least-recently-used first.
+    """
+
+    def __init__(self, path: str, max_conversion_bytes: int, max_embedding_bytes: int):
+        self._path = path
+        self._limits = {"conversions": max_conversion_bytes, "embeddings": max_embedding_bytes}
+        self._conn = None
+        self._lock = threading.Lock()
+        self.counters = {
+            "conversion_hits": 0, "conversion_misses": 0,
+            "embedding_hits": 0, "embedding_misses": 0,
+            "evictions": 0,
+        }
+
+    def _connection(self):
+        if self._conn is None:
+            Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversions ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size_bytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size_bytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_conversions_last_used ON conversions (last_used)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_conversion(self, file_hash: str) -> Optional[str]:
+        values = self._get_many("conversions", [file_hash])
+        if file_hash in values:
+            self.counters["conversion_hits"] += 1
+            return values[file_hash].decode("utf-8")
+        self.counters["conversion_misses"] += 1
+        return None
+
+    def put_conversion(self, file_hash: str, extracted_text: str):
+        self._put_many("conversions", {file_hash: extracted_text.encode("utf-8")})
+
+    def get_embeddings(self, keys: List[str]) -> Dict[str, List[float]]:
+        values = self._get_many("embeddings", keys)
+        self.counters["embedding_hits"] += len(values)
+        self.counters["embedding_misses"] += len(set(keys)) - len(values)
+        return {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in values.items()}
+
+    def put_embeddings(self, embeddings: Dict[str, List[float]]):
+        self._put_many("embeddings", {
+            key: np.asarray(vector, dtype=np.float32).tobytes() for key, vector in embeddings.items()
+        })
+
+    def stats(self):
+        with self._lock:
+            conn = self._connection()
+            sizes = {
+                table: conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM {table}").fetchone()
+                for table in self._limits
+            }
+        return {
+            **self.counters,
+            **{f"{table}_entries": count for table, (count, _) in sizes.items()},
+            **{f"{table}_bytes": size for table, (_, size) in sizes.items()},
+            **{f"{table}_max_bytes": limit for table, limit in self._limits.items()},
+        }
+
+    def _get_many(self, table: str, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):  # Stay under SQLite's bound parameter limit
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, value in conn.execute(f"SELECT key, value FROM {table} WHERE key IN ({placeholders})", batch):
+                    found[key] = value
+            if found:
+                now = time.time()
+                with conn:
+                    conn.executemany(f"UPDATE {table} SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+        return found
+
+    def _put_many(self, table: str, values: Dict[str, bytes]):
+        if not values:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} (key, value, size_bytes, last_used) VALUES (?, ?, ?, ?)",
+                    [(key, value, len(value), now) for key, value in values.items()],
+                )
+            self._evict(conn, table)
+
+    def _evict(self, conn, table: str):
+        limit = self._limits[table]
+        total = conn.execute(f"SELECT COALESCE(SUM(size_bytes), 0) FROM {table}").fetchone()[0]
+        if total <= limit:
+            return
+        to_free = total - limit
+        evicted_keys = []
+        for key, size in conn.execute(f"SELECT key, size_bytes FROM {table} ORDER BY last_used"):
+            evicted_keys.append((key,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        with conn:
+            conn.executemany(f"DELETE FROM {table} WHERE key = ?", evicted_keys)
+        self.counters["evictions"] += len(evicted_keys)
+
+
+content_cache = ContentCache(
+    path=config.CONTENT_CACHE_PATH,
+    max_conversion_bytes=config.CONVERSION_CACHE_MAX_MB * 1024 * 1024,
+    max_embedding_bytes=config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+)
@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from llama_index.core.storage.kvstore.types import BaseKVStore, DEFAULT_COLLECTION, DEFAULT_BATCH_SIZE
+
+import config
+
+
+class SQLiteKVStore(BaseKVStore):
+    """
+    Key/value store backed by a single SQLite file.
+    Writes are appends/upserts of individual rows, so adding nodes to a large space
+    does not rewrite what is already stored.
+    Each thread gets its own connection (reads run concurrently under WAL; writes are
+    serialized by _write_lock). close() closes them all; a later call reconnects.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._write_lock = threading.Lock()
+        self._connections_lock = threading.Lock()
+        self._connections = []
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " collection TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " PRIMARY KEY (collection, key))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Closes every connection opened by this store (the last close checkpoints the WAL)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(self, kv_pairs: List[Tuple[str, dict]], collection: str = DEFAULT_COLLECTION,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        # One transaction for the whole call, regardless of batch_size
+        rows = [(collection, key, json.dumps(val)) for key, val in kv_pairs]
+        with self._write_lock:
+            with self._connection() as conn:
+                conn.executemany("INSERT OR REPLACE INTO kv (collection, key, value) VALUES (?, ?, ?)", rows)
+
+    async def aput_all(self, kv_pairs: List[Tuple[str, dict]], collection: str = DEFAULT_COLLECTION,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.put_all(kv_pairs, collection=collection, batch_size=batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection=collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return dict(self.iter_all(collection=collection))
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection=collection)
+
+    def iter_all(self, collection: str = DEFAULT_COLLECTION, batch_size: int = 500) -> Iterator[Tuple[str, dict]]:
+        """Streams (key, value) pairs of a collection in key order without loading all of them."""
+        last_key = ""
+        while True:
+            rows = self._connection().execute(
+                "SELECT key, value FROM kv WHERE collection = ? AND key > ? ORDER BY key LIMIT ?",
+                (collection, last_key, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            for key, value in rows:
+                yield key, json.loads(value)
+            last_key = rows[-1][0]
+
+    def count(self, collection: str = DEFAULT_COLLECTION) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM kv WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def stored_bytes(self, collection: str = DEFAULT_COLLECTION) -> int:
+        row = self._connection().execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM kv WHERE collection = ?", (collection,)
+        ).fetchone()
+        return row[0]
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._write_lock:
+            with self._connection() as conn:
+                cursor = conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key))
+        return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """Document store on top of SQLiteKVStore: point lookups by node id and streaming iteration."""
+
+    def __init__(self, path: str, namespace: Optional[str] = None, batch_size: int = 100):
+        self._sqlite_kvstore = SQLiteKVStore(path)
+        super().__init__(self._sqlite_kvstore, namespace=namespace, batch_size=batch_size)
+
+    def iter_nodes(self):
+        for _, node_json in self._sqlite_kvstore.iter_all(collection=self._node_collection):
+            yield json_to_doc(node_json)
+
+    def node_count(self) -> int:
+        return self._sqlite_kvstore.count(collection=self._node_collection)
+
+    def stored_bytes(self) -> int:
+        return self._sqlite_kvstore.stored_bytes(collection=self._node_collection)
+
+    def close(self):
+        self._sqlite_kvstore.close()
+
+
+def space_storage_dir(space_id: int) -> Path:
+    return Path("./index_storage") / f"space_{space_id}"
+
+
+def open_docstore(space_id: int):
+    """
+    Opens the docstore of a space using the configured backend (DOCSTORE_BACKEND).
+    'sqlite' imports an existing docstore.json once; 'json' keeps the SimpleDocumentStore file.
+    """
+    storage_dir = space_storage_dir(space_id)
+    json_path = storage_dir / "docstore.json"
+
+    if config.DOCSTORE_BACKEND == "json":
+        if json_path.exists():
+            return SimpleDocumentStore.from_persist_path(str(json_path.as_posix()))
+        return SimpleDocumentStore()
+
+    if config.DOCSTORE_BACKEND != "sqlite":
+        raise ValueError(f"Unknown DOCSTORE_BACKEND '{config.DOCSTORE_BACKEND}'")
+
+    storage_dir.mkdir(parents=True, exist_ok=True)
+    sqlite_path = storage_dir / "docstore.sqlite"
+    if not sqlite_path.exists() and json_path.exists():
+        _import_json_docstore(json_path, sqlite_path)
+    return SQLiteDocumentStore(str(sqlite_path.as_posix()))
+
+
+def _import_json_docstore(json_path: Path, sqlite_path: Path):
+    """
+    One-time import of a legacy docstore.json. Built in a temporary file that only replaces
+    docstore.sqlite once complete, so an interrupted import is simply redone next time.
+    """
+    print(f"Migrating {json_path.as_posix()} to {sqlite_path.as_posix()}")
+    tmp_path = sqlite_path.with_name(sqlite_path.name + ".importing")
+    for leftover in (tmp_path, Path(f"{tmp_path}-wal"), Path(f"{tmp_path}-shm")):
+        leftover.unlink(missing_ok=True)  # From an import that was interrupted
+
+    legacy = SimpleDocumentStore.from_persist_path(str(json_path.as_posix()))
+    imported = SQLiteDocumentStore(str(tmp_path.as_posix()))
+    try:
+        imported.add_documents(list(legacy.docs.values()), allow_update=True)
+    finally:
+        imported.close()  # Checkpoints the WAL into the file before it is moved
+    os.replace(tmp_path, sqlite_path)
+
+
+def persist_docstore(space_id: int, docstore):
+    """SQLite commits as it goes; only the JSON backend has to rewrite its file."""
+    if isinstance(docstore, SimpleDocumentStore):
+        storage_dir = space_storage_dir(space_id)
+        storage_dir.mkdir(parents=True, exist_ok=True)
+        docstore.persist(persist_path=str((storage_dir / "docstore.json").as_posix()))
+
+
+def close_docstore(docstore):
+    """Releases a docstore opened for a one-off operation (the JSON backend holds nothing open)."""
+    if hasattr(docstore, "close"):
+        docstore.close()
+
+
+def iter_docstore_nodes(docstore):
+    if hasattr(docstore, "iter_nodes"):
+        return docstore.iter_nodes()
+    return iter(docstore.docs.values())
+
+
+def docstore_size_bytes(docstore) -> int:
+    if hasattr(docstore, "stored_bytes"):
+        return docstore.stored_bytes()
+    return sum(len(node.get_content()) for node in docstore.docs.values())
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import time
+
+import config
+from services import resources
+
+_converter = None  # One DocumentConverter per worker process
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    global _converter
+    from docling.document_converter import DocumentConverter
+    _converter = DocumentConverter()
+
+
+def convert_file(file_path: str):
+    """
+    Runs Docling on a file and returns its text. Failures are logged and re-raised, so the
+    caller can report why a file failed instead of only that it did.
+    """
+    if _converter is None:
+        _init_worker()
+    try:
+        result = _converter.convert(file_path)
+        return result.document.export_to_text()
+    except Exception as e:
+        print(f"Error converting {file_path}: {e}")
+        raise Exception(f"Docling could not convert the file: {e}") from e
+
+
+def convert_file_timed(file_path: str):
+    """
+    convert_file plus how long it took in the worker, as (text, seconds): metrics recorded
+    inside a worker process would never reach /metrics, so the parent records them.
+    """
+    start = time.perf_counter()
+    text = convert_file(file_path)
+    return text, time.perf_counter() - start
+
+
+class _InlineExecutor:
+    """Runs conversions in the calling thread (CONVERSION_WORKERS=0)."""
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def get_conversion_pool():
+    """Process pool for Docling conversion, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if config.CONVERSION_WORKERS > 0:
+                # Spawned, not forked: by now the process holds torch/CUDA state and running
+                # thread pools, which a forked child cannot re-initialise (and whose locks it
+                # could inherit in a held state)
+                _pool = ProcessPoolExecutor(
+                    max_workers=config.CONVERSION_WORKERS,
+                    initializer=_init_worker,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                _pool = _InlineExecutor()
+        return _pool
+
+
+def _worker_ready():
+    if _converter is None:
+        _init_worker()
+    return True
+
+
+def _warm_conversion_pool():
+    """Starts the conversion workers and waits for their DocumentConverters to load."""
+    pool = get_conversion_pool()
+    futures = [pool.submit(_worker_ready) for _ in range(max(1, config.CONVERSION_WORKERS))]
+    for future in futures:
+        future.result()
+    return pool
+
+# Warm-up target only: uploads use get_conversion_pool(), whose workers load Docling on their own
+converter_resource = resources.register("document_converter", _warm_conversion_pool)
@@ -0,0 +1,105 @@
+from pathlib import Path
+from typing import List
+
+import config
+
+
+def resolve_device() -> str:
+    """EMBEDDING_DEVICE, or CUDA when it is available and CPU otherwise."""
+    if config.EMBEDDING_DEVICE != "auto":
+        return config.EMBEDDING_DEVICE
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def build_local_embed_model(backend: str = None, device: str = None, threads: int = None):
+    """
+    Loads the embedding model in this process with the given backend (default EMBEDDING_BACKEND):
+      - torch:     the fp32 PyTorch model (CUDA or CPU)
+      - onnx:      the same model exported to ONNX Runtime
+      - onnx-int8: the ONNX model with dynamically quantized int8 weights, for CPU-only hosts
+    threads (default EMBEDDING_THREADS, 0 = library default) caps the intra-op threads.
+    """
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    backend = backend or config.EMBEDDING_BACKEND
+    device = device or resolve_device()
+    threads = config.EMBEDDING_THREADS if threads is None else threads
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of {BACKENDS}")
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbedding(model_name=config.EMBEDDING_MODEL, device=device)
+
+    model_kwargs = {}
+    if threads:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs["session_options"] = session_options
+
+    model_name = config.EMBEDDING_MODEL
+    if backend == "onnx-int8":
+        model_name, file_name = _quantized_onnx_model(config.EMBEDDING_MODEL, config.EMBEDDING_QUANTIZATION)
+        model_kwargs["file_name"] = file_name
+    return HuggingFaceEmbedding(model_name=model_name, device=device, backend="onnx", model_kwargs=model_kwargs)
+
+
+def _quantized_onnx_model(model_name: str, quantization: str):
+    """
+    Exports model_name to ONNX and quantizes it to int8 once, under EMBEDDING_MODELS_DIR.
+    Returns (local model dir, onnx file name relative to it).
+    """
+    local_dir = Path(config.EMBEDDING_MODELS_DIR) / model_name.replace("/", "__")
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if not (local_dir / file_name).exists():
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+        print(f"Quantizing {model_name} to int8 ({quantization}) in {local_dir.as_posix()}")
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save(str(local_dir.as_posix()))
+        export_dynamic_quantized_onnx_model(model, quantization, str(local_dir.as_posix()))
+    return str(local_dir.as_posix()), file_name
+
+
+def build_embed_model():
+    """
+    The embedding model used by ingestion and queries: the shared embedding server when
+    EMBEDDING_SERVER_ADDRESS is set, a local model otherwise, wrapped in the chunk cache.
+    """
+    if config.EMBEDDING_SERVER_ADDRESS:
+        from services.embedding_server import RemoteEmbedding
+        embed_model = RemoteEmbedding(
+            address=config.EMBEDDING_SERVER_ADDRESS,
+            authkey=config.EMBEDDING_SERVER_AUTHKEY,
+            model_name=config.EMBEDDING_MODEL,
+        )
+    else:
+        embed_model = build_local_embed_model()
+
+    if config.EMBEDDING_CACHE_ENABLED:
+        # Chunks already embedded for any space (shared course material, re-uploads) are a cache lookup
+        from services.cached_embedding import CachedEmbedding
+        embed_model = CachedEmbedding(embed_model)
+    return embed_model
+
+
+def embed_query_batch(embed_model, queries: List[str]) -> List[List[float]]:
+    """
+    Embeds several queries in one model call where the model supports it
+    (query embeddings may differ from text embeddings, e.g. BGE's query prompt).
+    """
+    if hasattr(embed_model, "get_query_embedding_batch"):
+        return embed_model.get_query_embedding_batch(queries)
+    if hasattr(embed_model, "_embed"):  # HuggingFaceEmbedding
+        return embed_model._embed(queries, prompt_name="query")
+    return [embed_model.get_query_embedding(query) for query in queries]
@@ -0,0 +1,100 @@
+"""
+Recall check for alternative embedding backends.
+
+Embeds the chunks of a space with the fp32 PyTorch baseline and with a candidate
+backend, then compares the top-k neighbours each returns for the same queries.
+Queries are the opening words of randomly sampled chunks unless a file with one
+query per line is given. Run from the backend directory:
+
+    python -m services.embedding_recall --space-id 3 --backend onnx-int8 --k 10
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+import config
+from services.docstore import close_docstore, open_docstore, iter_docstore_nodes
+from services.embedding_backends import BACKENDS, build_local_embed_model, embed_query_batch
+
+
+def _embed(embed_model, corpus, queries):
+    start = time.perf_counter()
+    corpus_vectors = np.asarray(embed_model.get_text_embedding_batch(corpus), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    query_vectors = np.asarray(embed_query_batch(embed_model, queries), dtype=np.float32)
+    corpus_vectors /= np.linalg.norm(corpus_vectors, axis=1, keepdims=True)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return corpus_vectors, query_vectors, len(corpus) / elapsed
+
+
+def _top_k(corpus_vectors, query_vectors, k):
+    scores = query_vectors @ corpus_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_check(corpus, queries, backend: str, k: int = 10, threads: int = None):
+    """Returns recall@k of the candidate backend against the fp32 baseline, plus throughput of both."""
+    baseline_model = build_local_embed_model(backend="torch", device="cpu", threads=threads)
+    base_corpus, base_queries, base_throughput = _embed(baseline_model, corpus, queries)
+    del baseline_model
+
+    candidate_model = build_local_embed_model(backend=backend, device="cpu", threads=threads)
+    cand_corpus, cand_queries, cand_throughput = _embed(candidate_model, corpus, queries)
+
+    k = min(k, len(corpus))
+    base_top = _top_k(base_corpus, base_queries, k)
+    cand_top = _top_k(cand_corpus, cand_queries, k)
+    recalls = [len(set(b) & set(c)) / k for b, c in zip(base_top, cand_top)]
+
+    return {
+        "backend": backend,
+        "k": k,
+        "corpus_size": len(corpus),
+        "queries": len(queries),
+        f"recall_at_{k}": float(np.mean(recalls)),
+        "min_recall": float(np.min(recalls)),
+        "mean_cosine_to_baseline": float(np.mean(np.sum(base_corpus * cand_corpus, axis=1))),
+        "baseline_texts_per_second": round(base_throughput, 2),
+        "candidate_texts_per_second": round(cand_throughput, 2),
+        "speedup": round(cand_throughput / base_throughput, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--space-id", type=int, required=True)
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="onnx-int8")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-chunks", type=int, default=2000)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--queries-file", help="One query per line instead of sampled chunk openings")
+    parser.add_argument("--threads", type=int, default=config.EMBEDDING_THREADS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = []
+    docstore = open_docstore(args.space_id)
+    for node in iter_docstore_nodes(docstore):
+        corpus.append(node.get_content())
+        if len(corpus) >= args.max_chunks:
+            break
+    close_docstore(docstore)
+    if not corpus:
+        raise SystemExit(f"Space {args.space_id} has no ingested chunks")
+
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        rng = random.Random(args.seed)
+        sample = rng.sample(corpus, min(args.num_queries, len(corpus)))
+        queries = [" ".join(text.split()[:12]) for text in sample]
+
+    print(json.dumps(recall_check(corpus, queries, args.backend, k=args.k, threads=args.threads), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Shared embedding worker.
+
+One process per host loads the embedding model; API workers talk to it over a
+multiprocessing connection (EMBEDDING_SERVER_ADDRESS) instead of each loading
+their own copy. Concurrent requests are coalesced into batches of up to
+EMBEDDING_SERVER_MAX_BATCH texts, waiting at most EMBEDDING_SERVER_MAX_WAIT_MS
+for a batch to fill up.
+
+Messages are pickled, so a peer that passes the authkey handshake can run code in the
+other process: EMBEDDING_SERVER_AUTHKEY must be set (to the same secret for the server and
+the API workers), and the server only listens beyond loopback with a strong key.
+
+Run from the backend directory:
+    EMBEDDING_SERVER_AUTHKEY=<secret> python -m services.embedding_server
+"""
+import ipaddress
+import asyncio
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+import config
+from services.embedding_backends import build_local_embed_model, embed_query_batch
+
+
+# The key this setting used to default to; anyone could guess it
+LEGACY_DEFAULT_AUTHKEY = b"memorize"
+MIN_REMOTE_AUTHKEY_BYTES = 16
+
+
+def parse_address(address: str):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_authkey(authkey: bytes, address: str = None):
+    """
+    Raises unless authkey is safe to use: it must be set, and a server listening on a
+    non-loopback address needs a key that is neither the old default nor short.
+    """
+    if not authkey:
+        raise Exception(
+            "EMBEDDING_SERVER_AUTHKEY is not set. Set it to the same secret for the embedding server "
+            "and the API workers, e.g. python -c \"import secrets; print(secrets.token_hex(32))\""
+        )
+    if address is not None and not _is_loopback(parse_address(address)[0]):
+        if authkey == LEGACY_DEFAULT_AUTHKEY or len(authkey) < MIN_REMOTE_AUTHKEY_BYTES:
+            raise Exception(
+                f"Refusing to listen on {address} with a default or short EMBEDDING_SERVER_AUTHKEY: "
+                f"use a random secret of at least {MIN_REMOTE_AUTHKEY_BYTES} characters"
+            )
+
+
+class DynamicBatcher:
+    """Collects embed requests from many threads and runs them through the model in batches."""
+
+    def __init__(self, embed_model, max_batch_size: int, max_wait_ms: float):
+        self._embed_model = embed_model
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        request = {"kind": kind, "texts": texts, "done": threading.Event(), "result": None, "error": None}
+        self._queue.put(request)
+        request["done"].wait()
+        if request["error"] is not None:
+            raise RuntimeError(request["error"])
+        return request["result"]
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0]["texts"])
+            deadline = time.monotonic() + self._max_wait
+            while count < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                count += len(request["texts"])
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        for kind in ("query", "text"):
+            requests = [request for request in batch if request["kind"] == kind]
+            if not requests:
+                continue
+            texts = [text for request in requests for text in request["texts"]]
+            try:
+                if kind == "query":
+                    vectors = embed_query_batch(self._embed_model, texts)
+                else:
+                    vectors = self._embed_model.get_text_embedding_batch(texts)
+                offset = 0
+                for request in requests:
+                    request["result"] = [list(vector) for vector in vectors[offset:offset + len(request["texts"])]]
+                    offset += len(request["texts"])
+            except Exception as e:
+                for request in requests:
+                    request["error"] = str(e)
+            self.batches += 1
+            self.texts += len(texts)
+            for request in requests:
+                request["done"].set()
+
+
+def _handle_connection(conn, batcher: DynamicBatcher):
+    with conn:
+        while True:
+            try:
+                kind, texts = conn.recv()
+            except (EOFError, OSError):
+                return
+            if kind == "ping":
+                conn.send(("ok", {"model": config.EMBEDDING_MODEL, "batches": batcher.batches, "texts": batcher.texts}))
+                continue
+            try:
+                conn.send(("ok", batcher.embed(kind, texts)))
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+
+def serve(address: str, authkey: bytes):
+    check_authkey(authkey, address)
+    embed_model = build_local_embed_model()
+    embed_model.embed_batch_size = config.EMBEDDING_SERVER_MAX_BATCH
+    batcher = DynamicBatcher(
+        embed_model,
+        max_batch_size=config.EMBEDDING_SERVER_MAX_BATCH,
+        max_wait_ms=config.EMBEDDING_SERVER_MAX_WAIT_MS,
+    )
+    print(f"Embedding server for {config.EMBEDDING_MODEL} listening on {address}")
+    with Listener(parse_address(address), authkey=authkey) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # e.g. a client with the wrong authkey
+                print(f"Rejected embedding client: {e}")
+                continue
+            threading.Thread(target=_handle_connection, args=(conn, batcher), daemon=True).start()
+
+
+class RemoteEmbedding(BaseEmbedding):
+    """Embedding model client for the shared embedding server (one connection per thread)."""
+
+    _address: str = PrivateAttr()
+    _authkey: bytes = PrivateAttr()
+    _local: Any = PrivateAttr()
+
+    def __init__(self, address: str, authkey: bytes, **kwargs: Any):
+        check_authkey(authkey)
+        super().__init__(**kwargs)
+        self._address = address
+        self._authkey = authkey
+        self._local = threading.local()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RemoteEmbedding"
+
+    def _request(self, kind: str, texts: List[str]):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = Client(parse_address(self._address), authkey=self._authkey)
+                self._local.conn = conn
+            try:
+                conn.send((kind, texts))
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Server restarted: reconnect once
+                self._local.conn = None
+                conn.close()
+                if attempt == 1:
+                    raise
+        if status == "error":
+            raise RuntimeError(f"Embedding server error: {payload}")
+        return payload
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        return self._request("query", queries)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._request("query", [query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._request("text", [text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._request("text", texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+
+if __name__ == "__main__":
+    serve(config.EMBEDDING_SERVER_ADDRESS or "127.0.0.1:8765", config.EMBEDDING_SERVER_AUTHKEY)
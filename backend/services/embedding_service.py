@@ -1,101 +1,315 @@
-import os
-from typing import List
-from llama_index.core import Settings, StorageContext, VectorStoreIndex, Document,load_index_from_storage
-from llama_index.core.storage.docstore import SimpleDocumentStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.vector_stores.chroma import ChromaVectorStore
-import chromadb
-from llama_index.retrievers.bm25 import BM25Retriever
-from llama_index.core.node_parser import SentenceSplitter
-from pathlib import Path # Import pathlib for path manipulation
-
-
-Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-base-en-v1.5", device="cuda")
-def generate_embeddings_and_store(space_id: int, document_texts: List[str]):
-    """
-    Generates embeddings for given document texts and stores them in ChromaDB.
-    Uses space_id for path and collection naming for better organization.
-    """
-    try:
-        # 1. Setup ChromaDB client and collection
-        chroma_path = Path("./chroma_db") / f"space_{space_id}" # Use pathlib for path construction
-        db = chromadb.PersistentClient(path=str(chroma_path.as_posix())) # Convert to string with forward slashes
-        chroma_collection_name = f"space_{space_id}_collection"
-        chroma_collection = db.get_or_create_collection(chroma_collection_name)
-
-        # 2. Initialize ChromaVectorStore and SimpleDocumentStore
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        docstore_path = Path("./index_storage") / f"space_{space_id}"/"docstore.json"
-        if docstore_path.exists():
-            print(f"Existing files: {os.listdir(docstore_path.parent)}")
-            docstore = SimpleDocumentStore.from_persist_path(str(docstore_path.as_posix()))  # Load existing docstore
-        else:
-            docstore = SimpleDocumentStore()  # Create new docstore
-        storage_context = StorageContext.from_defaults(docstore=docstore, vector_store=vector_store)
-
-        # 3. Create LlamaIndex Documents and Nodes
-        documents = [Document(text=text) for text in document_texts] # Create LlamaIndex Document objects
-        splitter = SentenceSplitter(chunk_size=512) # Use SentenceSplitter as in your notebook
-        nodes = splitter.get_nodes_from_documents(documents) # Split documents into nodes
-        storage_context.docstore.add_documents(nodes)
-
-        # 4. Create VectorStoreIndex
-        index = VectorStoreIndex(
-            nodes=nodes,
-            storage_context=storage_context,
-            show_progress=True,
-            insert_batch_size=100,
-            store_nodes_override=True
-        )
-        bm25_retriever = BM25Retriever.from_defaults(docstore=docstore)
-
-        # 5. Persist Docstore and Index using pathlib for paths and forward slashes
-        index_persist_path = Path("./index_storage") / f"space_{space_id}" # Use pathlib
-        index_persist_path.mkdir(parents=True, exist_ok=True) # pathlib's mkdir for directory creation
-        index.storage_context.persist(persist_dir=str(index_persist_path.as_posix()))
-        
-
-
-
-        return {"message": f"Embeddings generated and stored for space id '{space_id}'",
-                "index_persist_path": str(index_persist_path.as_posix()),
-                }
-
-    except Exception as e:
-        error_message = f"Error generating embeddings and storing for space id '{space_id}': {str(e)}"
-        print(error_message)
-        raise Exception(error_message)
-    
-def load_index_for_space(space_id: int):
-    index_persist_path = Path("./index_storage") / f"space_{space_id}"
-    docstore_path = index_persist_path / "docstore.json"
-    print(f"[DEBUG - Loading] Attempting to load index from path: {str(index_persist_path.as_posix())}")
-    
-    try:
-        # Reinitialize the vector store using the same settings as during indexing
-        chroma_path = Path("./chroma_db") / f"space_{space_id}"
-        db = chromadb.PersistentClient(path=str(chroma_path.as_posix()))
-        chroma_collection_name = f"space_{space_id}_collection"
-        chroma_collection = db.get_or_create_collection(chroma_collection_name)
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        # docstore = SimpleDocumentStore.from_persist_path(str(index_persist_path.as_posix()))
-        if docstore_path.exists():
-            docstore = SimpleDocumentStore.from_persist_path(str(docstore_path.as_posix()))
-        else:
-            docstore = SimpleDocumentStore()
-
-        # Now pass the vector_store into the storage context when loading the index
-        storage_context = StorageContext.from_defaults(
-            persist_dir=str(index_persist_path.as_posix()),
-            docstore=docstore,
-            vector_store=vector_store
-        )
-        index = load_index_from_storage(storage_context)
-        bm25_retriever = BM25Retriever.from_defaults(docstore=docstore,similarity_top_k=2)
-        print(f"[DEBUG - Loading] Index loaded successfully from: {str(index_persist_path.as_posix())}")
-        return index ,bm25_retriever
-    except Exception as e:
-        error_message = (f"Error loading index for space id '{space_id}' from path "
-                         f"'{str(index_persist_path.as_posix())}': {str(e)}")
-        print(error_message)
-        raise Exception(error_message)
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+from llama_index.core import Settings, StorageContext, VectorStoreIndex, Document
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import MetadataMode
+from pathlib import Path # Import pathlib for path manipulation
+from services.index_cache import index_cache, estimate_docstore_size
+from services import bm25_store, vector_store as vector_stores
+from services.docstore import close_docstore, open_docstore, persist_docstore
+from services.embedding_backends import build_embed_model
+from services.response_cache import response_cache
+from services import metrics, resources
+from services.jobs import JobCancelled
+import config
+
+
+def _load_embed_model():
+    embed_model = build_embed_model()
+    Settings.embed_model = embed_model
+    return embed_model
+
+embed_model_resource = resources.register("embedding_model", _load_embed_model)
+
+
+def get_embed_model():
+    """The embedding model, loaded on first use (and set as Settings.embed_model)."""
+    return embed_model_resource.get()
+
+
+def document_ref_id(document_id: int) -> str:
+    """ref_doc_id of the nodes built from a documents_table row."""
+    return f"document_{document_id}"
+
+
+def _open_vector_store(space_id: int):
+    # Long-lived client, in the per-space or shared layout (VECTOR_STORE_LAYOUT)
+    return vector_stores.get_vector_store(space_id)
+
+
+def _delete_ref_docs(space_id: int, vector_store, docstore, ref_doc_ids) -> int:
+    """Removes the nodes of the given source documents from Chroma, the docstore and BM25."""
+    removed = 0
+    for ref_doc_id in ref_doc_ids:
+        ref_doc_info = docstore.get_ref_doc_info(ref_doc_id)
+        if ref_doc_info is None:
+            continue
+        removed += len(ref_doc_info.node_ids)
+        vector_store.delete(ref_doc_id)
+        docstore.delete_ref_doc(ref_doc_id, raise_error=False)
+    if removed:
+        bm25_store.remove_from_bm25_index(space_id, ref_doc_ids)
+    return removed
+
+
+def _iter_segments(text: str, segment_chars: int):
+    """
+    Yields (offset, segment) pieces of at most ~segment_chars characters, cut at paragraph
+    breaks where possible, so a very long document is never split in one go.
+    """
+    start = 0
+    while start < len(text):
+        end = min(start + segment_chars, len(text))
+        if end < len(text):
+            paragraph_break = text.rfind("\n\n", start + segment_chars // 2, end)
+            if paragraph_break != -1:
+                end = paragraph_break + 2
+        yield start, text[start:end]
+        start = end
+
+
+def _split_document(splitter, document_id, text: str):
+    """Splits one document segment by segment; node offsets stay relative to the whole document."""
+    nodes = []
+    with metrics.span("chunking"):
+        for offset, segment in _iter_segments(text, config.INGESTION_SEGMENT_CHARS):
+            if document_id is None:
+                document = Document(text=segment) # Create LlamaIndex Document objects
+            else:
+                # The document id is metadata only: it must not change the embedded or prompted text
+                document = Document(
+                    text=segment,
+                    id_=document_ref_id(document_id),
+                    metadata={"source_document_id": document_id},
+                    excluded_embed_metadata_keys=["source_document_id"],
+                    excluded_llm_metadata_keys=["source_document_id"],
+                )
+            for node in splitter.get_nodes_from_documents([document]):
+                if node.start_char_idx is not None:
+                    node.start_char_idx += offset
+                if node.end_char_idx is not None:
+                    node.end_char_idx += offset
+                nodes.append(node)
+    return nodes
+
+
+def _iter_nodes(splitter, documents):
+    """
+    Yields the nodes of (document_id, text) pairs in order. Up to INGESTION_SPLIT_WORKERS
+    documents are split in parallel ahead of the consumer, and documents are only pulled from
+    the (possibly lazy) input as workers free up, so at most that many are held at once.
+    """
+    workers = max(1, config.INGESTION_SPLIT_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for document_id, text in documents:
+            if not text:
+                continue
+            pending.append(pool.submit(_split_document, splitter, document_id, text))
+            if len(pending) >= workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _batched(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_embeddings_and_store(
+    space_id: int,
+    document_texts: Iterable[str],
+    document_ids: Optional[List[int]] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    on_batch=None,
+):
+    """
+    Generates embeddings for given document texts and stores them in ChromaDB.
+    Uses space_id for path and collection naming for better organization.
+    With document_ids, nodes are tagged with their documents_table id and any nodes
+    previously stored for those documents are replaced.
+
+    Runs as a pipeline with bounded memory: documents (document_texts may be a lazy iterable)
+    are split in parallel, and nodes are embedded and written to Chroma, the docstore and the
+    BM25 log in batches of INGESTION_EMBED_BATCH_NODES. on_batch(nodes_in_batch) is called
+    after each batch is stored; if it raises, the batches already stored are kept and indexed.
+    """
+    try:
+        # 1-2. Chroma collection of the space and the space docstore (new nodes are appended, existing ones are not loaded)
+        vector_store = _open_vector_store(space_id)
+        docstore = open_docstore(space_id)
+        cached = False  # Whether the cache took over the docstore (and will close it)
+        try:
+            storage_context = StorageContext.from_defaults(docstore=docstore, vector_store=vector_store)
+            embed_model = get_embed_model()
+            index = VectorStoreIndex(
+                nodes=[],
+                storage_context=storage_context,
+                embed_model=embed_model,
+                insert_batch_size=100,
+            )
+
+            # 3. Documents and nodes, produced lazily
+            nodes_replaced = 0
+            if document_ids is None:
+                documents = ((None, text) for text in document_texts)
+            else:
+                document_ids = list(document_ids)
+                nodes_replaced = _delete_ref_docs(space_id, vector_store, docstore, [document_ref_id(i) for i in document_ids])
+                documents = zip(document_ids, document_texts)
+            splitter = SentenceSplitter(
+                chunk_size=chunk_size or config.DEFAULT_CHUNK_SIZE,
+                chunk_overlap=config.DEFAULT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+            )
+
+            # 4. Embed and store batch by batch; the BM25 snapshot is rebuilt once at the end
+            nodes_created = 0
+            try:
+                for batch in _batched(_iter_nodes(splitter, documents), config.INGESTION_EMBED_BATCH_NODES):
+                    storage_context.docstore.add_documents(batch)
+                    # Embedded here rather than inside insert_nodes (which skips nodes that already
+                    # have an embedding), so the model and Chroma show up as separate stages
+                    with metrics.span("embedding_batch"):
+                        embeddings = embed_model.get_text_embedding_batch(
+                            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+                        )
+                    for node, embedding in zip(batch, embeddings):
+                        node.embedding = embedding
+                    with metrics.span("chroma_upsert"):
+                        index.insert_nodes(batch)
+                    bm25_store.update_bm25_index(space_id, batch, docstore=docstore, rebuild=False)
+                    nodes_created += len(batch)
+                    if on_batch:
+                        on_batch(len(batch))
+            finally:
+                if nodes_created or nodes_replaced:
+                    cached = _finish_update(space_id, index, vector_store, docstore)
+
+            index_persist_path = Path("./index_storage") / f"space_{space_id}" # Use pathlib
+            return {"message": f"Embeddings generated and stored for space id '{space_id}'",
+                    "index_persist_path": str(index_persist_path.as_posix()),
+                    "nodes_created": nodes_created,
+                    "nodes_replaced": nodes_replaced,
+                    }
+        finally:
+            if not cached:
+                close_docstore(docstore)
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        error_message = f"Error generating embeddings and storing for space id '{space_id}': {str(e)}"
+        print(error_message)
+        raise Exception(error_message)
+
+
+def _finish_update(space_id: int, index, vector_store, docstore):
+    # Only the new nodes were tokenized; the rest of the space comes from the persisted BM25 index
+    bm25_store.rebuild_bm25_index(space_id)
+    bm25_retriever = bm25_store.load_bm25_retriever(space_id, similarity_top_k=2)
+
+    # 5. Persist the docstore (no-op for SQLite, which commits as nodes are added)
+    persist_docstore(space_id, docstore)
+
+    # 6. Keep an already cached copy of this space in sync with what was just persisted,
+    # and drop cached answers that could not have used the new documents. Returns whether
+    # the cache kept the docstore (otherwise the caller closes it)
+    response_cache.invalidate(space_id)
+    return index_cache.refresh(space_id, {
+        "index": index,
+        "vector_store": vector_store,
+        "docstore": docstore,
+        "bm25_retriever": bm25_retriever,
+        "size_bytes": estimate_docstore_size(docstore),
+    })
+
+def load_index_for_space(space_id: int):
+    """
+    Returns (index, bm25_retriever) for a space, served from the process-wide index cache.
+    """
+    entry = index_cache.get_or_load(space_id, _load_space)
+    return entry["index"], entry["bm25_retriever"]
+
+def _load_space(space_id: int):
+    index_persist_path = Path("./index_storage") / f"space_{space_id}"
+    docstore = None
+    try:
+        with metrics.span("index_load", sample_rate=1.0):
+            # Reinitialize the vector store using the same settings as during indexing
+            vector_store = _open_vector_store(space_id)
+            docstore = open_docstore(space_id)
+
+            # The index is a thin wrapper over Chroma, which holds the node text; the docstore is
+            # only consulted for point lookups, so nothing has to be deserialized up front
+            storage_context = StorageContext.from_defaults(docstore=docstore, vector_store=vector_store)
+            index = VectorStoreIndex(nodes=[], storage_context=storage_context, embed_model=get_embed_model())
+            bm25_retriever = bm25_store.load_bm25_retriever(space_id, similarity_top_k=2, docstore=docstore)
+        return {
+            "index": index,
+            "vector_store": vector_store,
+            "docstore": docstore,
+            "bm25_retriever": bm25_retriever,
+            "size_bytes": estimate_docstore_size(docstore),
+        }
+    except Exception as e:
+        if docstore is not None:
+            close_docstore(docstore)
+        error_message = (f"Error loading index for space id '{space_id}' from path "
+                         f"'{str(index_persist_path.as_posix())}': {str(e)}")
+        print(error_message)
+        raise Exception(error_message)
+
+
+def has_document_nodes(space_id: int, document_id: int) -> bool:
+    """Whether the space holds nodes tagged with this document id."""
+    docstore = open_docstore(space_id)
+    try:
+        return docstore.get_ref_doc_info(document_ref_id(document_id)) is not None
+    finally:
+        close_docstore(docstore)
+
+
+def delete_document_nodes(space_id: int, document_ids: List[int]) -> int:
+    """
+    Removes the nodes of the given documents from Chroma, the docstore and the BM25 index
+    of a space, leaving the rest of the space untouched. Returns the number of nodes removed
+    (0 for documents embedded before nodes were tagged with their document id).
+    """
+    try:
+        vector_store = _open_vector_store(space_id)
+        docstore = open_docstore(space_id)
+        try:
+            removed = _delete_ref_docs(space_id, vector_store, docstore, [document_ref_id(i) for i in document_ids])
+            persist_docstore(space_id, docstore)
+        finally:
+            close_docstore(docstore)  # The cached copy of the space is invalidated below, not kept
+    except Exception as e:
+        error_message = f"Error deleting documents {document_ids} from space id '{space_id}': {str(e)}"
+        print(error_message)
+        raise Exception(error_message)
+
+    if removed:
+        response_cache.invalidate(space_id)
+        index_cache.invalidate(space_id)
+    return removed
+
+
+def reset_space_index(space_id: int):
+    """
+    Drops everything indexed for a space (vectors, docstore, BM25), for spaces whose nodes
+    predate document id tagging and therefore cannot be removed one document at a time.
+    """
+    index_cache.invalidate(space_id)
+    response_cache.invalidate(space_id)
+    vector_stores.delete_space(space_id)
+    shutil.rmtree(Path("./index_storage") / f"space_{space_id}", ignore_errors=True)
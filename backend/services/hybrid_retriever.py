@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+import config
+from services import metrics
+
+# Shared by every request: each hybrid retrieval runs its vector and BM25 sides here
+_executor = ThreadPoolExecutor(max_workers=config.HYBRID_RETRIEVER_WORKERS)
+
+
+def reciprocal_rank_fusion(result_lists, top_k: int = None, k: int = 60) -> List[NodeWithScore]:
+    """
+    Fuses ranked lists of NodeWithScore by reciprocal rank: each node scores the sum of
+    1 / (k + rank) over the lists it appears in. Scores are accumulated with NumPy over
+    all (node, rank) pairs at once. Returns NodeWithScore sorted by fused score.
+    """
+    positions = {}  # node_id -> position, in order of first appearance
+    nodes = []
+    node_positions = []
+    ranks = []
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            position = positions.get(result.node.node_id)
+            if position is None:
+                position = positions[result.node.node_id] = len(nodes)
+                nodes.append(result.node)
+            node_positions.append(position)
+            ranks.append(rank)
+    if not nodes:
+        return []
+
+    scores = np.zeros(len(nodes), dtype=np.float64)
+    np.add.at(scores, np.asarray(node_positions), 1.0 / (k + np.asarray(ranks, dtype=np.float64) + 1))
+    order = np.argsort(-scores, kind="stable")  # Ties keep first-appearance order
+    if top_k is not None:
+        order = order[:top_k]
+    return [NodeWithScore(node=nodes[i], score=float(scores[i])) for i in order]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Vector + BM25 retrieval fused by reciprocal rank. Both sides run concurrently on a
+    shared thread pool, so the async path never blocks the event loop and needs no
+    nested loop (unlike QueryFusionRetriever with use_async=True).
+    """
+
+    def __init__(self, vector_retriever, bm25_retriever=None, similarity_top_k: int = 2):
+        self._vector_retriever = vector_retriever
+        self._bm25_retriever = bm25_retriever
+        self._similarity_top_k = similarity_top_k
+        super().__init__()
+
+    def _retrievers(self):
+        sides = (("vector_retrieval", self._vector_retriever), ("bm25_retrieval", self._bm25_retriever))
+        return [(stage, r) for stage, r in sides if r is not None]
+
+    @staticmethod
+    def _retrieve_side(stage: str, retriever, query_bundle: QueryBundle):
+        with metrics.span(stage):
+            return retriever.retrieve(query_bundle)
+
+    def retrieve_lists(self, query_bundle: QueryBundle):
+        """The unfused ranked lists of each side, e.g. for fusing with other spaces."""
+        futures = [_executor.submit(self._retrieve_side, stage, r, query_bundle) for stage, r in self._retrievers()]
+        return [future.result() for future in futures]
+
+    async def aretrieve_lists(self, query_bundle: QueryBundle):
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(_executor, self._retrieve_side, stage, r, query_bundle)
+            for stage, r in self._retrievers()
+        ])
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return reciprocal_rank_fusion(self.retrieve_lists(query_bundle), top_k=self._similarity_top_k)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return reciprocal_rank_fusion(await self.aretrieve_lists(query_bundle), top_k=self._similarity_top_k)
@@ -0,0 +1,162 @@
+import threading
+from collections import OrderedDict
+
+import config
+
+
+class SpaceIndexCache:
+    """
+    Bounded LRU cache of loaded space resources (index, vector store, BM25 retriever).
+    Entries are evicted least-recently-used first once either the number of cached
+    spaces or their estimated size goes over the configured limits.
+
+    Each space also has a generation, bumped by refresh() and invalidate() whether or not
+    the space is cached. A load that started before a bump may have read the old data
+    (e.g. the BM25 snapshot an ingestion just replaced), so it is loaded again instead.
+
+    The cache owns the docstores of its entries: an entry that is evicted, replaced or
+    invalidated has its docstore closed.
+    """
+
+    def __init__(self, max_spaces: int, max_bytes: int):
+        self.max_spaces = max_spaces
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # space_id -> entry dict
+        self._lock = threading.Lock()
+        # space_id -> [lock, waiters], so a space is only loaded once at a time; an entry only
+        # exists while some request is loading or waiting for that space
+        self._load_locks = {}
+        self._generations = {}  # space_id -> number of refreshes and invalidations so far
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_loads = 0
+
+    def get_or_load(self, space_id: int, loader):
+        """
+        Returns the cached entry for space_id, calling loader(space_id) on a miss.
+        loader must return a dict with at least a 'size_bytes' key.
+        """
+        with self._lock:
+            entry = self._entries.get(space_id)
+            if entry is not None:
+                self._entries.move_to_end(space_id)
+                self.hits += 1
+                return entry
+            load_state = self._load_locks.setdefault(space_id, [threading.Lock(), 0])
+            load_state[1] += 1
+
+        try:
+            with load_state[0]:
+                # Another request may have loaded the space while we were waiting
+                with self._lock:
+                    entry = self._entries.get(space_id)
+                    if entry is not None:
+                        self._entries.move_to_end(space_id)
+                        self.hits += 1
+                        return entry
+                    self.misses += 1
+                    generation = self._generations.get(space_id, 0)
+                while True:
+                    entry = loader(space_id)
+                    with self._lock:
+                        if generation == self._generations.get(space_id, 0):
+                            dropped = self._put(space_id, entry)
+                            break
+                        # Refreshed or invalidated while loading: what was read may be outdated
+                        self.stale_loads += 1
+                        generation = self._generations.get(space_id, 0)
+                    _release([entry])
+            _release(dropped)
+            return entry
+        finally:
+            with self._lock:
+                load_state[1] -= 1
+                if not load_state[1]:
+                    del self._load_locks[space_id]
+
+    def refresh(self, space_id: int, entry: dict):
+        """Replaces the entry for space_id, but only if the space is already cached."""
+        with self._lock:
+            self._bump_generation(space_id)
+            if space_id not in self._entries:
+                return False
+            dropped = self._put(space_id, entry)
+        _release(dropped)
+        return True
+
+    def invalidate(self, space_id: int):
+        with self._lock:
+            self._bump_generation(space_id)
+            entry = self._entries.pop(space_id, None)
+        if entry is None:
+            return False
+        _release([entry])
+        return True
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        _release(entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_loads": self.stale_loads,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "cached_spaces": list(self._entries.keys()),
+                "size_bytes": sum(e["size_bytes"] for e in self._entries.values()),
+                "max_spaces": self.max_spaces,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _bump_generation(self, space_id: int):
+        self._generations[space_id] = self._generations.get(space_id, 0) + 1
+
+    def _put(self, space_id: int, entry: dict):
+        """
+        Stores an entry and evicts down to the limits. Called with self._lock held; returns the
+        entries it dropped, for the caller to _release once the lock is released.
+        """
+        dropped = []
+        previous = self._entries.get(space_id)
+        if previous is not None and previous is not entry:
+            dropped.append(previous)
+        self._entries[space_id] = entry
+        self._entries.move_to_end(space_id)
+        total = sum(e["size_bytes"] for e in self._entries.values())
+        # Always keep the entry that was just stored, even if it is larger than the budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_spaces or total > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted["size_bytes"]
+            self.evictions += 1
+            dropped.append(evicted)
+        return dropped
+
+
+def _release(entries):
+    """
+    Closes the docstores of entries that left the cache. A request still holding one keeps
+    working: the SQLite docstore reconnects on its next query.
+    """
+    from services.docstore import close_docstore
+    for entry in entries:
+        if "docstore" in entry:
+            close_docstore(entry["docstore"])
+
+
+def estimate_docstore_size(docstore) -> int:
+    """Rough in-memory footprint of a space: stored node data plus the BM25 corpus copy of it."""
+    from services.docstore import docstore_size_bytes
+    return docstore_size_bytes(docstore) * 2
+
+
+index_cache = SpaceIndexCache(
+    max_spaces=config.INDEX_CACHE_MAX_SPACES,
+    max_bytes=config.INDEX_CACHE_MAX_MB * 1024 * 1024,
+)
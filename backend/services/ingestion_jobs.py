@@ -0,0 +1,140 @@
+from sqlalchemy import select, and_
+
+import config
+from database import SessionLocal, documents_table, spaces_table
+from services import embedding_service
+from services.jobs import Job, JobQueue
+
+ingestion_queue = JobQueue(
+    max_workers=config.INGESTION_WORKERS,
+    max_per_key=config.INGESTION_MAX_JOBS_PER_SPACE,
+)
+
+
+def submit_ingestion(space_id: int, document_ids):
+    job = Job("ingestion", space_id, progress={
+        "documents_total": len(document_ids),
+        "documents_processed": 0,
+        "nodes_processed": 0,
+        "batches_committed": 0,
+    })
+    return ingestion_queue.submit(job, lambda job: _run_ingestion(job, list(document_ids)))
+
+
+def submit_reindex(space_id: int):
+    """
+    Queues a full rebuild of a space's index. Used when a document changes in a space whose
+    nodes predate document id tagging, so its old nodes cannot be removed on their own.
+    """
+    job = Job("ingestion", space_id, progress={
+        "reindex": True,
+        "documents_total": 0,
+        "documents_processed": 0,
+        "nodes_processed": 0,
+        "batches_committed": 0,
+    })
+    return ingestion_queue.submit(job, _run_reindex)
+
+
+def submit_document_delete(space_id: int, document_id: int):
+    """
+    Queues the removal of a document's nodes from the space index. It runs in the space's
+    ingestion slot, so it cannot remove nodes a running batch is about to store again.
+    """
+    job = Job("document_delete", space_id, progress={"document_id": document_id})
+    return ingestion_queue.submit(
+        job, lambda job: {"nodes_removed": embedding_service.delete_document_nodes(space_id, [document_id])}
+    )
+
+
+def _run_reindex(job: Job):
+    # Runs in the space's ingestion slot, so it cannot interleave with another ingestion job
+    space_id = job.key
+    embedding_service.reset_space_index(space_id)
+    db = SessionLocal()
+    try:
+        db.execute(
+            documents_table.update().where(documents_table.c.space_id == space_id).values(is_embedded=False)
+        )
+        db.commit()
+        document_ids = [row.id for row in db.execute(
+            select(documents_table.c.id).where(documents_table.c.space_id == space_id)
+        ).fetchall()]
+    finally:
+        db.close()
+    return _run_ingestion(job, document_ids)
+
+
+def _run_ingestion(job: Job, document_ids):
+    """
+    Embeds the documents in batches of INGESTION_BATCH_DOCUMENTS. Each batch is stored
+    in Chroma/docstore/BM25 and then marked is_embedded in its own transaction, so a
+    cancelled or failed job keeps everything that was committed before it stopped.
+    Document texts are read from the database one at a time as the chunking pipeline
+    needs them, with the space's chunk size and overlap.
+    """
+    space_id = job.key
+    db = SessionLocal()
+
+    def load_texts(ids):
+        for document_id in ids:
+            yield db.execute(
+                select(documents_table.c.extracted_text).where(documents_table.c.id == document_id)
+            ).scalar()
+
+    def on_batch(nodes_in_batch):
+        job.progress["nodes_processed"] += nodes_in_batch
+        job.check_cancelled()  # Stored batches are kept; re-embedding a document replaces them
+
+    try:
+        space = db.execute(
+            select(spaces_table.c.chunk_size, spaces_table.c.chunk_overlap).where(spaces_table.c.id == space_id)
+        ).fetchone()
+
+        # Another job for this space may have embedded some of these while we were queued
+        pending_ids = [row.id for row in db.execute(
+            select(documents_table.c.id).where(and_(
+                documents_table.c.id.in_(document_ids),
+                documents_table.c.is_embedded == False,
+            ))
+        ).fetchall()]
+        job.progress["documents_total"] = len(pending_ids)
+
+        batch_size = config.INGESTION_BATCH_DOCUMENTS
+        for start in range(0, len(pending_ids), batch_size):
+            job.check_cancelled()
+            batch_ids = pending_ids[start:start + batch_size]
+            text_ids = [row.id for row in db.execute(
+                select(documents_table.c.id).where(and_(
+                    documents_table.c.id.in_(batch_ids),
+                    documents_table.c.extracted_text.isnot(None),
+                ))
+            ).fetchall()]
+
+            if text_ids:
+                # Nodes are tagged with their document id, so a document embedded again
+                # (after being replaced) has its previous nodes swapped out
+                embedding_service.generate_embeddings_and_store(
+                    space_id=space_id,
+                    document_texts=load_texts(text_ids),
+                    document_ids=text_ids,
+                    chunk_size=space.chunk_size if space else None,
+                    chunk_overlap=space.chunk_overlap if space else None,
+                    on_batch=on_batch,
+                )
+
+            db.execute(
+                documents_table.update().where(documents_table.c.id.in_(batch_ids)).values(is_embedded=True)
+            )
+            db.commit()
+
+            job.progress["documents_processed"] += len(batch_ids)
+            job.progress["batches_committed"] += 1
+
+        return {
+            "space_id": space_id,
+            "documents_processed": job.progress["documents_processed"],
+            "nodes_processed": job.progress["nodes_processed"],
+        }
+    finally:
+        db.close()
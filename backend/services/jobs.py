@@ -0,0 +1,180 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    A unit of background work. Runners report progress by updating job.progress
+    and call job.check_cancelled() between steps so cancellation takes effect.
+    """
+
+    def __init__(self, kind: str, key, progress: dict = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"  # queued -> running -> completed | failed | cancelled
+        self.progress = dict(progress or {})
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None  # Set by JobQueue.submit; resolves when the job finishes
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self):
+        elapsed = None
+        throughput = {}
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0:
+                throughput = {
+                    f"{name}_per_second": round(value / elapsed, 3)
+                    for name, value in self.progress.items()
+                    if isinstance(value, (int, float)) and not isinstance(value, bool)
+                }
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "progress": dict(self.progress),
+            "throughput": throughput,
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Runs jobs on a shared thread pool, with at most max_per_key jobs running at once
+    for the same key (e.g. the same space). Jobs over that limit wait in a per-key queue
+    and are only handed to the pool when a job of their key finishes, so a busy key never
+    holds pool threads that jobs for other keys could use. Finished jobs are kept for
+    status polling up to max_finished_jobs.
+    """
+
+    def __init__(self, max_workers: int, max_per_key: int = 1, max_finished_jobs: int = 500):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._max_per_key = max_per_key
+        self._max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        self._running_per_key = {}
+        self._pending_per_key = {}  # key -> deque of (job, runner) waiting for a slot
+        self._lock = threading.Lock()
+
+    def submit(self, job: Job, runner):
+        """Queues runner(job); its return value becomes job.result."""
+        job.future = Future()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            if self._running_per_key.get(job.key, 0) >= self._max_per_key:
+                self._pending_per_key.setdefault(job.key, deque()).append((job, runner))
+                return job
+            self._running_per_key[job.key] = self._running_per_key.get(job.key, 0) + 1
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, key=None):
+        with self._lock:
+            return [job for job in self._jobs.values() if key is None or job.key == key]
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return job
+        job.cancel()
+        with self._lock:
+            pending = self._pending_per_key.get(job.key)
+            entry = next((entry for entry in pending or () if entry[0] is job), None)
+            if entry is not None:
+                pending.remove(entry)
+                if not pending:
+                    del self._pending_per_key[job.key]
+        if entry is not None:
+            # Never started: finish it now instead of when its turn comes
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            job.future.set_result(None)
+        return job
+
+    def depth(self) -> int:
+        """Number of jobs waiting to start."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == "queued")
+
+    def _run(self, job: Job, runner):
+        try:
+            if job.cancel_requested:
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = runner(job)
+                job.status = "completed"
+            except JobCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                print(f"Job {job.kind} {job.id} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+        finally:
+            job.future.set_result(None)
+            self._release(job.key)
+
+    def _release(self, key):
+        """Hands the freed slot of key to its next waiting job, if any."""
+        with self._lock:
+            pending = self._pending_per_key.get(key)
+            if pending:
+                next_job, next_runner = pending.popleft()
+                if not pending:
+                    del self._pending_per_key[key]
+            else:
+                next_job = None
+                self._running_per_key[key] -= 1
+                if not self._running_per_key[key]:
+                    del self._running_per_key[key]
+        if next_job is not None:
+            self._executor.submit(self._run, next_job, next_runner)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - self._max_finished_jobs)]:
+            del self._jobs[job_id]
@@ -0,0 +1,94 @@
+import os
+import threading
+
+from llama_index.core import Settings
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMChatStartEvent,
+    LLMCompletionEndEvent,
+    LLMCompletionStartEvent,
+)
+
+import config
+from services import metrics, resources
+
+
+def build_llm():
+    """
+    The LLM used to answer queries: Gemini, or with LLM_BACKEND=fake a local MockLLM
+    that needs no API key and streams deterministic tokens (for tests and benchmarks).
+    """
+    if config.LLM_BACKEND == "fake":
+        from llama_index.core.llms import MockLLM
+        return MockLLM(max_tokens=config.FAKE_LLM_MAX_TOKENS)
+    if config.LLM_BACKEND != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND '{config.LLM_BACKEND}'")
+
+    from llama_index.llms.gemini import Gemini
+    if config.GOOGLE_API_KEY:
+        os.environ["GOOGLE_API_KEY"] = config.GOOGLE_API_KEY
+    return Gemini(model=config.QUERY_LLM_MODEL)
+
+
+_sampled_calls = {}  # span_id -> start event of a query LLM call being timed
+_sampled_calls_lock = threading.Lock()
+
+
+class _LLMMetricsHandler(BaseEventHandler):
+    """
+    Times sampled query LLM calls (stage query_llm) and counts their tokens, from LlamaIndex's
+    instrumentation events, so it works for every LLM backend and for streamed answers.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LLMMetricsHandler"
+
+    def handle(self, event, **kwargs):
+        if isinstance(event, LLMCompletionStartEvent):
+            self._started(event, event.prompt)
+        elif isinstance(event, LLMChatStartEvent):
+            self._started(event, "\n".join(str(message.content or "") for message in event.messages))
+        elif isinstance(event, LLMCompletionEndEvent):
+            self._ended(event, event.response.text if event.response else "")
+        elif isinstance(event, LLMChatEndEvent):
+            self._ended(event, event.response.message.content if event.response else "")
+
+    def _started(self, event, prompt: str):
+        metrics.llm_tokens.inc(metrics.estimate_tokens(prompt), source="query", direction="prompt")
+        if event.span_id is not None and metrics.sampled("query_llm"):
+            with _sampled_calls_lock:
+                if len(_sampled_calls) > 1000:
+                    _sampled_calls.clear()  # Failed calls never send an end event
+                _sampled_calls[event.span_id] = event
+
+    def _ended(self, event, output: str):
+        metrics.llm_tokens.inc(metrics.estimate_tokens(output or ""), source="query", direction="output")
+        with _sampled_calls_lock:
+            start = _sampled_calls.pop(event.span_id, None)
+        if start is not None:
+            metrics.stage_seconds.observe(
+                (event.timestamp - start.timestamp).total_seconds(), stage="query_llm", outcome="ok"
+            )
+
+
+_metrics_handler = None
+
+
+def _load_llm():
+    global _metrics_handler
+    llm = build_llm()
+    Settings.llm = llm
+    if _metrics_handler is None:
+        _metrics_handler = _LLMMetricsHandler()
+        get_dispatcher().add_event_handler(_metrics_handler)
+    return llm
+
+llm_resource = resources.register("llm", _load_llm)
+
+
+def get_llm():
+    """The query LLM, built on first use (and set as Settings.llm)."""
+    return llm_resource.get()
@@ -0,0 +1,204 @@
+"""
+Per-stage timing spans and counters, exported in the Prometheus text format by GET /metrics.
+
+    with metrics.span("embedding_batch"):
+        ...
+
+Spans are sampled: a call is timed with probability METRICS_SAMPLE_RATE (or the span's own
+sample_rate, e.g. 1.0 for rare, expensive stages) and an unsampled call costs one random()
+and a shared no-op context manager. Histogram counts are therefore sampled counts; the rate
+of each stage is exported as memorize_stage_sample_rate so they can be scaled back up.
+Counters are exact.
+"""
+import random
+import threading
+import time
+
+import config
+
+# Seconds; covers a BM25 lookup (sub-millisecond) up to a podcast LLM call (minutes)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        for _, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, extra_samples=()):
+        """extra_samples: (label values, value) pairs counted elsewhere, exported under the same name."""
+        with self._lock:
+            values = dict(self._values)
+        for key, value in extra_samples:
+            values[tuple(str(v) for v in key)] = values.get(tuple(str(v) for v in key), 0) + value
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        position = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                position = i
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+def gauge_lines(name: str, documentation: str, samples, label_names=(), metric_type: str = "gauge"):
+    """
+    Lines for a metric whose values are read at scrape time, e.g. queue depths or counters kept
+    by another component. samples is a list of (label values, value).
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    lines += [f"{name}{_format_labels(label_names, key)} {_format_value(value)}" for key, value in samples]
+    return lines
+
+
+stage_seconds = Histogram(
+    "memorize_stage_duration_seconds",
+    "Duration of sampled pipeline stages (upload, conversion, chunking, embedding, retrieval, LLM, TTS, encoding).",
+    label_names=("stage", "outcome"),
+)
+cache_requests = Counter(
+    "memorize_cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    label_names=("cache", "result"),
+)
+llm_tokens = Counter(
+    "memorize_llm_tokens_total",
+    "Tokens sent to and received from the LLM (from the API's usage metadata, else estimated at ~4 characters per token).",
+    label_names=("source", "direction"),
+)
+
+_stage_rates = {}
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stage_seconds.observe(time.perf_counter() - self.start, stage=self.stage, outcome="error" if exc_type else "ok")
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def sampled(stage: str, sample_rate: float = None) -> bool:
+    """Decides whether to time one call of a stage."""
+    rate = config.METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+    if stage not in _stage_rates:
+        _stage_rates[stage] = rate
+    if not config.METRICS_ENABLED or rate <= 0:
+        return False
+    return rate >= 1 or random.random() < rate
+
+
+def span(stage: str, sample_rate: float = None):
+    """Context manager timing one call of a stage into memorize_stage_duration_seconds, if sampled."""
+    return _Span(stage) if sampled(stage, sample_rate) else _NOOP_SPAN
+
+
+def observe(stage: str, seconds: float, error: bool = False, sample_rate: float = 1.0):
+    """
+    Records a duration measured elsewhere, e.g. in a worker process. Pass the rate the
+    caller sampled at (with sampled()) if it did not time every call.
+    """
+    _stage_rates.setdefault(stage, sample_rate)
+    if config.METRICS_ENABLED:
+        stage_seconds.observe(seconds, stage=stage, outcome="error" if error else "ok")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4
+
+
+def render(extra_lines=(), cache_samples=()) -> str:
+    """
+    Every metric of this module plus extra_lines, as a Prometheus text exposition.
+    cache_samples are hit/miss counts kept by the caches themselves, as ((cache, result), count).
+    """
+    lines = []
+    lines += stage_seconds.render()
+    lines += gauge_lines(
+        "memorize_stage_sample_rate",
+        "Share of calls of each stage that are timed; divide histogram counts by it to estimate call counts.",
+        [((stage,), rate) for stage, rate in sorted(_stage_rates.items())],
+        label_names=("stage",),
+    )
+    lines += cache_requests.render(cache_samples)
+    lines += llm_tokens.render()
+    lines += list(extra_lines)
+    return "\n".join(lines) + "\n"
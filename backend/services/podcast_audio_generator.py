@@ -1,77 +1,235 @@
-import json
-import os
-import tempfile
-from kokoro import KPipeline
-import soundfile as sf
-import torch
-from pydub import AudioSegment
-from datetime import datetime
-import uuid
-def generate_podcast_audio(dialogue_json_str:str,space_id: str):
-
-    try:
-        dialogue_data = json.loads(dialogue_json_str)
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        return None
-    
-    pipeline = KPipeline(lang_code='a')
-
-    audio_folder = os.path.join(os.path.dirname(__file__),"audio_files")
-    if not os.path.exists(audio_folder):
-        os.makedirs(audio_folder)
-    
-    audio_files = []
-
-    for idx, entry in enumerate(dialogue_data):
-        text = entry['text']
-        speaker = entry['speaker']
-
-        voice = 'af_bella' if speaker.lower() == 'expert' else 'am_fenrir'
-
-        generator = pipeline(
-            text,
-            voice=voice,
-            speed=1,
-            split_pattern=r'\n+'
-        )
-
-        for i, (gs, ps, audio) in enumerate(generator):
-            filename = f"{idx}_{i}.wav"
-            filepath = os.path.join(audio_folder, filename)
-            sf.write(filepath, audio, 24000)
-            audio_files.append(filepath)
-            print(f"Saved: {filepath}")
-    
-    # Concatenation logic (modified)
-    podcast_folder = os.path.join(
-        os.path.dirname(__file__), 
-        "..",  # Move up one level from services directory
-        "podcasts", 
-        f"space_{space_id}"
-    )
-    os.makedirs(podcast_folder, exist_ok=True)
-
-    # Update output path
-    output_file = f"podcast_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}.wav"
-    output_path = os.path.join(podcast_folder, output_file)
-
-    if audio_files:
-        try:
-            combined = AudioSegment.empty()
-            # Remove sorting - use original order
-            for file_path in audio_files:
-                sound = AudioSegment.from_wav(file_path)
-                combined += sound
-            
-            # output_path = os.path.join(podcast_folder, output_file)
-            combined.export(output_path, format="wav")
-            print(f"Concatenated podcast saved to {output_path}")
-            for file_path in audio_files:
-                os.remove(file_path)
-            return output_path
-        except Exception as e:
-            print(f"Error concatenating audio files: {e}")
-            return None
-
-    return output_path
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+from datetime import datetime
+import uuid
+
+import config
+from services import metrics, resources
+
+SAMPLE_RATE = 24000
+SPEED = 1
+PODCASTS_FOLDER = os.path.join(os.path.dirname(__file__), "..", "podcasts")
+AUDIO_CODECS = {"opus": "libopus", "mp3": "libmp3lame"}  # "wav" is written directly
+
+_model_lock = threading.Lock()
+_thread_state = threading.local()
+_executor = None
+
+
+def _load_model():
+    import torch
+    from kokoro import KModel
+    # Process-wide and set once, before the first inference: TTS_WORKERS turns run at a time,
+    # each on TTS_TORCH_THREADS intra-op threads
+    if config.TTS_TORCH_THREADS:
+        torch.set_num_threads(config.TTS_TORCH_THREADS)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return KModel().to(device).eval()
+
+tts_model_resource = resources.register("tts_model", _load_model)
+
+
+def _get_model():
+    """The Kokoro model weights, loaded on first use and shared by every synthesis thread."""
+    return tts_model_resource.get()
+
+
+def get_tts_pipeline():
+    """
+    A Kokoro pipeline for the calling thread. Pipelines keep per-call G2P state, so each
+    worker thread gets its own, all of them running the same shared model.
+    """
+    pipeline = getattr(_thread_state, "pipeline", None)
+    if pipeline is None:
+        from kokoro import KPipeline
+        pipeline = KPipeline(lang_code='a', model=_get_model())
+        _thread_state.pipeline = pipeline
+    return pipeline
+
+
+def resolve_audio_format() -> str:
+    """
+    The format podcasts are actually written in: PODCAST_AUDIO_FORMAT, or WAV when it needs
+    ffmpeg and ffmpeg is not on the PATH.
+    """
+    audio_format = config.PODCAST_AUDIO_FORMAT
+    if audio_format in AUDIO_CODECS and shutil.which("ffmpeg") is None:
+        print(f"ffmpeg not found on the PATH: writing podcasts as WAV instead of {audio_format}")
+        return "wav"
+    return audio_format
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _model_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.TTS_WORKERS)
+    return _executor
+
+
+def _to_numpy(audio):
+    if hasattr(audio, "detach"):  # torch tensor
+        audio = audio.detach().cpu().numpy()
+    return np.asarray(audio, dtype=np.float32)
+
+
+def _cache_path(voice: str, speed: float, text: str) -> Path:
+    key = hashlib.sha256(f"{voice}\x00{speed}\x00{text}".encode("utf-8")).hexdigest()
+    return Path(config.TTS_CACHE_DIR) / key[:2] / f"{key}.npy"
+
+
+def _evict_tts_cache():
+    """Keeps the on-disk TTS cache under TTS_CACHE_MAX_MB, removing least recently used clips first."""
+    files = [(p, p.stat()) for p in Path(config.TTS_CACHE_DIR).glob("*/*.npy")]
+    total = sum(stat.st_size for _, stat in files)
+    limit = config.TTS_CACHE_MAX_MB * 1024 * 1024
+    for path, stat in sorted(files, key=lambda item: item[1].st_mtime):
+        if total <= limit:
+            break
+        try:
+            path.unlink()
+            total -= stat.st_size
+        except OSError:
+            pass
+
+
+def synthesize_turn(text: str, voice: str, speed: float = SPEED):
+    """
+    Renders one dialogue turn, or loads it from the (voice, speed, text) cache.
+    Returns a float32 array at SAMPLE_RATE (empty if nothing was generated).
+    """
+    cache_path = _cache_path(voice, speed, text)
+    if cache_path.exists():
+        try:
+            audio = np.load(cache_path)
+            os.utime(cache_path)  # Mark as recently used for eviction
+            metrics.cache_requests.inc(cache="tts", result="hit")
+            return audio
+        except (OSError, ValueError):
+            pass  # Unreadable entry: render again and overwrite it
+    metrics.cache_requests.inc(cache="tts", result="miss")
+
+    pipeline = get_tts_pipeline()
+    with metrics.span("tts_synthesis", sample_rate=1.0):
+        segments = [
+            _to_numpy(audio)
+            for gs, ps, audio in pipeline(text, voice=voice, speed=speed, split_pattern=r'\n+')
+            if audio is not None
+        ]
+    audio = np.concatenate(segments) if segments else np.zeros(0, dtype=np.float32)
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{uuid.uuid4().hex[:8]}.tmp.npy")
+    np.save(tmp_path, audio)
+    os.replace(tmp_path, cache_path)
+    return audio
+
+
+class _AudioWriter:
+    """
+    Writes float32 PCM to the final podcast file: WAV through soundfile, Opus/MP3 by piping
+    the samples into ffmpeg, so encoding runs alongside synthesis without an intermediate WAV.
+    """
+
+    def __init__(self, path: str, audio_format: str, bitrate: str):
+        self._soundfile = None
+        self._process = None
+        if audio_format == "wav":
+            self._soundfile = sf.SoundFile(path, mode="w", samplerate=SAMPLE_RATE, channels=1, format="WAV")
+        elif audio_format in AUDIO_CODECS:
+            self._process = subprocess.Popen(
+                [
+                    "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+                    "-c:a", AUDIO_CODECS[audio_format], "-b:a", bitrate,
+                    path,
+                ],
+                stdin=subprocess.PIPE,
+            )
+        else:
+            raise ValueError(f"Unsupported PODCAST_AUDIO_FORMAT '{audio_format}'")
+
+    def write(self, audio):
+        if self._soundfile is not None:
+            self._soundfile.write(audio)
+        else:
+            self._process.stdin.write(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+
+    def close(self):
+        if self._soundfile is not None:
+            self._soundfile.close()
+        else:
+            self._process.stdin.close()
+            if self._process.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with code {self._process.returncode}")
+
+
+def generate_podcast_audio(dialogue_json_str:str,space_id: str, on_turn_rendered=None):
+    """
+    Renders the dialogue and encodes it as PODCAST_AUDIO_FORMAT at PODCAST_AUDIO_BITRATE
+    (as WAV if that format needs ffmpeg and it is missing; see resolve_audio_format).
+    on_turn_rendered(rendered, total) is called as turns are written, for progress reporting.
+    Returns the output path, or None if rendering failed.
+    """
+
+    try:
+        dialogue_data = json.loads(dialogue_json_str)
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON: {e}")
+        return None
+
+    podcast_folder = os.path.join(PODCASTS_FOLDER, f"space_{space_id}")
+    os.makedirs(podcast_folder, exist_ok=True)
+
+    # Update output path
+    audio_format = resolve_audio_format()
+    output_file = f"podcast_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}.{audio_format}"
+    output_path = os.path.join(podcast_folder, output_file)
+
+    # Turns are independent once their voice is known: render them across the TTS worker
+    # pool, then stream them into the final file in dialogue order
+    executor = _get_executor()
+    futures = []
+    for entry in dialogue_data:
+        voice = 'af_bella' if entry['speaker'].lower() == 'expert' else 'am_fenrir'
+        futures.append(executor.submit(synthesize_turn, entry['text'], voice))
+
+    samples_written = 0
+    try:
+        output = _AudioWriter(output_path, audio_format, config.PODCAST_AUDIO_BITRATE)
+        try:
+            for rendered, future in enumerate(futures, start=1):
+                audio = future.result()
+                with metrics.span("audio_encoding", sample_rate=1.0):
+                    output.write(audio)
+                samples_written += len(audio)
+                if on_turn_rendered:
+                    on_turn_rendered(rendered, len(futures))
+        finally:
+            with metrics.span("audio_encoding_finish", sample_rate=1.0):
+                output.close()  # Waits for ffmpeg to flush the encoder
+    except Exception as e:
+        print(f"Error generating podcast audio: {e}")
+        for future in futures:
+            future.cancel()
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return None
+    finally:
+        _evict_tts_cache()
+
+    if not samples_written:
+        os.remove(output_path)
+        return None
+
+    print(f"Podcast saved to {output_path}")
+    return output_path
@@ -0,0 +1,182 @@
+import asyncio
+
+from llama_index.core.node_parser import SentenceSplitter
+from sqlalchemy import select
+
+import config
+from database import SessionLocal, spaces_table
+from services import bm25_store, embedding_service
+from services.docstore import iter_docstore_nodes
+from services.metrics import estimate_tokens
+from services.podcast_pipeline import run_stage, content_hash
+from services.hybrid_retriever import reciprocal_rank_fusion
+
+MAP_PROMPT = (
+    "Summarize the following excerpts from course material{topic_clause}. "
+    "Keep every definition, key concept, theory, example and open question; drop repetition and boilerplate. "
+    "Write plain prose, no markdown.\n\nExcerpts:\n{text}"
+)
+REDUCE_PROMPT = (
+    "Combine the following partial summaries of the same course material{topic_clause} into one coherent, "
+    "comprehensive summary. Merge overlapping points, keep all distinct concepts, definitions and examples, "
+    "and order them logically. Write plain prose, no markdown.\n\nPartial summaries:\n{text}"
+)
+
+
+def _topic_clause(focus_topic: str) -> str:
+    return f", focusing on everything relevant to '{focus_topic}'" if focus_topic else ""
+
+
+def _reading_order(node):
+    return (node.ref_doc_id or "", node.start_char_idx or 0)
+
+
+def _fit_budget(nodes, token_budget: int):
+    selected = []
+    used = 0
+    for node in nodes:
+        tokens = estimate_tokens(node.get_content())
+        if used + tokens > token_budget:
+            continue
+        selected.append(node)
+        used += tokens
+    return selected
+
+
+def select_chunks(space_id: int, focus_topic: str = None, token_budget: int = None):
+    """
+    Picks the chunks of a space that go into the podcast, within token_budget:
+      - with a focus topic, the hybrid (vector + BM25) top matches fused by reciprocal rank
+      - without one, the whole space, thinned out evenly when it does not fit; the docstore
+        is streamed twice (once to size it, once to sample it), so only the selected chunks
+        are ever held in memory
+    Chunks are returned in reading order. Returns [] if the space has not been ingested.
+    """
+    token_budget = token_budget or config.PODCAST_CONTEXT_TOKEN_BUDGET
+    try:
+        index, bm25_retriever = embedding_service.load_index_for_space(space_id)
+    except Exception as e:
+        print(f"No index for space {space_id}, falling back to raw document text: {e}")
+        return []
+    if bm25_retriever is None:
+        return []
+
+    if focus_topic:
+        top_k = config.PODCAST_RETRIEVAL_TOP_K
+        vector_results = index.as_retriever(similarity_top_k=top_k).retrieve(focus_topic)
+        bm25_results = bm25_store.with_top_k(bm25_retriever, top_k).retrieve(focus_topic)
+        fused = reciprocal_rank_fusion([vector_results, bm25_results])
+        selected = _fit_budget([result.node for result in fused], token_budget)
+    else:
+        docstore = index.storage_context.docstore
+        total_tokens = sum(estimate_tokens(node.get_content()) for node in iter_docstore_nodes(docstore))
+        selected = _fit_budget(_sample_nodes(iter_docstore_nodes(docstore), token_budget / max(total_tokens, 1)), token_budget)
+
+    return sorted(selected, key=_reading_order)
+
+
+def _sample_nodes(nodes, fraction: float):
+    """
+    Yields an evenly spread share of a node stream: each node adds fraction of its tokens
+    as credit, and a node is kept once the credit covers it. fraction >= 1 keeps everything.
+    """
+    credit = 0.0
+    for node in nodes:
+        tokens = estimate_tokens(node.get_content())
+        credit += fraction * tokens
+        if credit >= tokens:
+            credit -= tokens
+            yield node
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    return text if estimate_tokens(text) <= max_tokens else text[:max_tokens * 4]
+
+
+def _batch_by_tokens(texts, batch_tokens: int):
+    batches, current, used = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and used + tokens > batch_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _map_reduce(client, texts, focus_topic: str, use_cache: bool):
+    semaphore = asyncio.Semaphore(config.PODCAST_MAP_CONCURRENCY)
+    topic_clause = _topic_clause(focus_topic)
+
+    async def summarize(stage: str, prompt: str, batch):
+        text = "\n\n".join(batch)
+        async with semaphore:
+            return await run_stage(
+                client, stage, content_hash(focus_topic or "", text),
+                [prompt.format(topic_clause=topic_clause, text=text)],
+                use_cache=use_cache,
+            )
+
+    # Map: summarize batches of chunks in parallel
+    summaries = await asyncio.gather(*[
+        summarize("map_summary", MAP_PROMPT, batch)
+        for batch in _batch_by_tokens(texts, config.PODCAST_MAP_BATCH_TOKENS)
+    ])
+
+    # Reduce: combine summaries (again in parallel batches) until they fit in one prompt
+    limit = config.PODCAST_REDUCE_MAX_TOKENS
+    while len(summaries) > 1 and sum(estimate_tokens(s) for s in summaries) > limit:
+        batches = _batch_by_tokens(summaries, limit)
+        if len(batches) == len(summaries):
+            # Each summary alone is near the limit: shorten them so they merge at least pairwise
+            summaries = [_truncate_tokens(summary, limit // 2) for summary in summaries]
+            batches = _batch_by_tokens(summaries, limit)
+        summaries = await asyncio.gather(*[summarize("reduce_summary", REDUCE_PROMPT, batch) for batch in batches])
+    if len(summaries) > 1:  # They fit in one prompt now
+        summaries = [await summarize("reduce_summary", REDUCE_PROMPT, summaries)]
+    # The outline and dialogue stages get at most the context budget, however long the model wrote
+    return _truncate_tokens(summaries[0], config.PODCAST_CONTEXT_TOKEN_BUDGET) if summaries else ""
+
+
+def _space_splitter(space_id: int) -> SentenceSplitter:
+    """Splits like ingestion would for this space (its chunk settings, or the defaults)."""
+    db = SessionLocal()
+    try:
+        space = db.execute(
+            select(spaces_table.c.chunk_size, spaces_table.c.chunk_overlap).where(spaces_table.c.id == space_id)
+        ).fetchone()
+    finally:
+        db.close()
+    chunk_size = (space.chunk_size if space else None) or config.DEFAULT_CHUNK_SIZE
+    chunk_overlap = space.chunk_overlap if space and space.chunk_overlap is not None else config.DEFAULT_CHUNK_OVERLAP
+    return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=min(chunk_overlap, chunk_size // 2))
+
+
+async def build_podcast_context(client, space_id: int, focus_topic: str = None, fallback_texts=None, use_cache: bool = True):
+    """
+    Builds the source text for the outline and dialogue stages: selects the relevant chunks of
+    the space within the token budget and reduces them to a summary map-reduce style.
+    fallback_texts() is called for spaces that have not been ingested yet; their text is split
+    into chunks on the fly and goes through the same budget and map-reduce steps.
+    """
+    nodes = await asyncio.to_thread(select_chunks, space_id, focus_topic)
+    texts = [node.get_content() for node in nodes]
+
+    if not texts and fallback_texts is not None:
+        raw_texts = await asyncio.to_thread(fallback_texts)
+        splitter = await asyncio.to_thread(_space_splitter, space_id)
+        chunks = [chunk for text in raw_texts for chunk in splitter.split_text(text)]
+        texts = []
+        used = 0
+        for chunk in chunks:
+            used += estimate_tokens(chunk)
+            if used > config.PODCAST_CONTEXT_TOKEN_BUDGET:
+                break
+            texts.append(chunk)
+
+    if not texts:
+        return ""
+    return await _map_reduce(client, texts, focus_topic, use_cache)
@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+from google import genai
+from sqlalchemy import select
+
+import config
+from database import SessionLocal, documents_table, podcasts_table
+from services import podcast_audio_generator, podcast_context, podcast_pipeline
+from services.jobs import Job, JobQueue
+
+podcast_queue = JobQueue(max_workers=config.PODCAST_WORKERS, max_per_key=1)
+
+STAGES = ("context", "outline_and_summaries", "dialogue", "tts", "saving")
+
+
+def submit_podcast(space_id: int, focus_topic: str = None, use_cache: bool = True):
+    job = Job("podcast", space_id, progress={
+        "stage": "queued",
+        "stages_completed": 0,
+        "stages_total": len(STAGES),
+        "turns_rendered": 0,
+        "turns_total": 0,
+    })
+    return podcast_queue.submit(job, lambda job: _run_podcast(job, focus_topic, use_cache))
+
+
+def _load_document_texts(space_id: int):
+    # Only needed for spaces that have not been ingested yet
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(documents_table.c.extracted_text).where(documents_table.c.space_id == space_id)
+        ).fetchall()
+        return [row.extracted_text for row in rows if row.extracted_text is not None]
+    finally:
+        db.close()
+
+
+def _run_podcast(job: Job, focus_topic: str, use_cache: bool):
+    """
+    Generates a podcast for job.key in a worker thread: context, script stages, TTS and
+    encoding, then records it in podcasts_table. job.progress["stage"] names the current
+    stage; cancellation takes effect between stages.
+    """
+    space_id = job.key
+
+    def enter_stage(stage: str):
+        job.check_cancelled()
+        if job.progress["stage"] in STAGES:
+            job.progress["stages_completed"] += 1
+        job.progress["stage"] = stage
+
+    def on_turn_rendered(rendered: int, total: int):
+        job.progress["turns_rendered"] = rendered
+        job.progress["turns_total"] = total
+
+    async def build_script():
+        # One client per job: each job runs its own event loop, and the async client's
+        # connections must not be shared across loops
+        client = genai.Client(api_key=config.GOOGLE_API_KEY)
+        enter_stage("context")
+        context = await podcast_context.build_podcast_context(
+            client, space_id, focus_topic,
+            fallback_texts=lambda: _load_document_texts(space_id),
+            use_cache=use_cache,
+        )
+        if not context:
+            raise Exception(f"Space '{space_id}' has no document text to build a podcast from")
+        return await podcast_pipeline.generate_podcast_script(client, context, use_cache=use_cache, on_stage=enter_stage)
+
+    script = asyncio.run(build_script())
+    dialogue_text = script["dialogue"]
+    clean_json = dialogue_text.replace("```json", "").replace("```", "").strip()
+
+    enter_stage("tts")
+    audio_path = podcast_audio_generator.generate_podcast_audio(clean_json, space_id, on_turn_rendered=on_turn_rendered)
+    if not audio_path:
+        raise Exception("Audio generation failed")
+
+    enter_stage("saving")
+    relative_path = f"space_{space_id}/{os.path.basename(audio_path)}"
+    db = SessionLocal()
+    try:
+        db.execute(podcasts_table.insert().values(
+            space_id=space_id,
+            transcript=dialogue_text,
+            audio_path=relative_path,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    job.progress["stages_completed"] += 1
+    job.progress["stage"] = "done"
+    return {
+        "space_id": space_id,
+        "audio_url": f"/podcasts/{relative_path}",
+        "transcript": dialogue_text,
+    }
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import time
+from pathlib import Path
+
+from google.genai import types
+
+import config
+from services import metrics
+
+# Bump a stage's version whenever its prompt changes, so cached outputs of the old prompt are not reused
+PROMPT_VERSIONS = {
+    "map_summary": "1",
+    "reduce_summary": "1",
+    "outline": "1",
+    "role_summaries": "1",
+    "dialogue": "2",  # 2: passes the outline/summary text instead of the response objects
+}
+
+SYS_INSTRUCT = "You are an expert podcast scriptwriter. You create structured, engaging, and well-organized podcast outlines."
+DIALOGUE_SYS_INSTRUCT = "Generate a 10-minute podcast dialogue (≈1500 words) between two AI personas. Format: [Speaker]: [Dialogue line]. No markdown, no scene descriptions, only natural conversation. "
+
+
+def content_hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class StageCache:
+    """On-disk cache of stage outputs, one JSON file per (stage, input hash)."""
+
+    def __init__(self, directory: str, ttl_seconds: float):
+        self._directory = Path(directory)
+        self._ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self._directory / stage / f"{key}.json"
+
+    def get(self, stage: str, key: str):
+        path = self._path(stage, key)
+        if path.exists() and time.time() - path.stat().st_mtime <= self._ttl_seconds:
+            self.hits += 1
+            return json.loads(path.read_text(encoding="utf-8"))["output"]
+        self.misses += 1
+        return None
+
+    def put(self, stage: str, key: str, output: str):
+        path = self._path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"stage": stage, "output": output}), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+stage_cache = StageCache(config.PODCAST_STAGE_CACHE_DIR, config.PODCAST_STAGE_CACHE_TTL_SECONDS)
+
+
+async def run_stage(client, stage: str, input_hash: str, contents, system_instruction: str = None, use_cache: bool = True):
+    """Runs one Gemini call through the async client, reusing its cached output for identical inputs."""
+    key = content_hash(stage, PROMPT_VERSIONS[stage], config.PODCAST_LLM_MODEL, input_hash)
+    if use_cache:
+        cached = stage_cache.get(stage, key)
+        if cached is not None:
+            return cached
+
+    with metrics.span(f"podcast_llm_{stage}", sample_rate=1.0):
+        response = await client.aio.models.generate_content(
+            model=config.PODCAST_LLM_MODEL,
+            config=types.GenerateContentConfig(system_instruction=system_instruction) if system_instruction else None,
+            contents=contents,
+        )
+    _count_tokens(response, [system_instruction, *contents])
+    stage_cache.put(stage, key, response.text)
+    return response.text
+
+
+def _count_tokens(response, prompt_parts):
+    """Adds a call's tokens to memorize_llm_tokens_total, estimating them if Gemini reported no usage."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        prompt_tokens = sum(metrics.estimate_tokens(str(part)) for part in prompt_parts if part)
+    if output_tokens is None:
+        output_tokens = metrics.estimate_tokens(response.text)
+    metrics.llm_tokens.inc(prompt_tokens, source="podcast", direction="prompt")
+    metrics.llm_tokens.inc(output_tokens, source="podcast", direction="output")
+
+
+async def generate_outline(client, source_text: str, use_cache: bool = True):
+    return await run_stage(client, "outline", content_hash(source_text), [
+        f"Generate a structured podcast outline using the provided chapter text. "
+        "Each section should be summarized in one or two sentences max."
+        "Organize it into these sections:\n"
+        "1. Introduction (Engage the audience, introduce key ideas)\n"
+        "2. Key Concepts (Break down important definitions, theories, or principles)\n"
+        "3. Debates & Challenges (Discuss common controversies or misunderstandings)\n"
+        "4. Applications & Real-World Examples (How is this knowledge used?)\n"
+        "5. Conclusion (Summarize takeaways, future perspectives, and open questions)\n\n"
+        f"Chapter Text:\n{source_text}"
+    ], system_instruction=SYS_INSTRUCT, use_cache=use_cache)
+
+
+async def generate_role_summaries(client, source_text: str, use_cache: bool = True):
+    return await run_stage(client, "role_summaries", content_hash(source_text), [
+        "Generate two summaries for the given text"
+        "expert Level:"
+        "Summarize the given chapter text as if you are explaining it to an advanced scholar or researcher in this field. Include"
+        "Technical terminology & in-depth analysis"
+        "Key theories,models"
+        "cross references to similar topics os historical developlments"
+        "challenges,contradictions,and nuances"
+        "novice level:"
+        "summarize the given chapter text in a way that a beginner with no background knowledge can understand use:"
+        "simple language and analogies"
+        "examples form everyday life"
+        "common misconceptions and how to clarify them"
+        "engaging questions to spark curiosity"
+        f"Chapter Text:\n{source_text}"
+    ], system_instruction=SYS_INSTRUCT, use_cache=use_cache)
+
+
+async def generate_dialogue(client, outline: str, role_summaries: str, use_cache: bool = True):
+    return await run_stage(client, "dialogue", content_hash(outline, role_summaries), [
+        "Create a podcast dialogue between two AI personas"
+        "AI 1(expert):A professor-level speaker who explains with deep knowledge"
+        "AI 2 (Novice): A curious learner who asks simple but thought provoking questions"
+        "use the outline below to structure the conversation. the expert should explain using the expert summary, while the novice should challenge ideas ask for examples or request simpler explanations using the novice summary"
+        "maintain a natural, engaging,and dynamic conversation style. The Expert should respond patiently and adjust explanations when needed"
+        f"here is the outline{outline}"
+        f"here is the role based summaries of expert and novice{role_summaries}"
+        "the response should be json [{'speaker':'expert','text':'dialogues'},{'speaker':'novice','text':'dialogues'}] and continue"
+    ], system_instruction=DIALOGUE_SYS_INSTRUCT, use_cache=use_cache)
+
+
+async def generate_podcast_script(client, source_text: str, use_cache: bool = True, on_stage=None):
+    """
+    Runs the script stages on the (already reduced) source text: outline and role-based
+    summaries concurrently, since they only depend on the source text, then the dialogue.
+    on_stage(name) is called as each step starts. Returns every stage's output.
+    """
+    if on_stage:
+        on_stage("outline_and_summaries")
+    outline, role_summaries = await asyncio.gather(
+        generate_outline(client, source_text, use_cache=use_cache),
+        generate_role_summaries(client, source_text, use_cache=use_cache),
+    )
+    if on_stage:
+        on_stage("dialogue")
+    dialogue = await generate_dialogue(client, outline, role_summaries, use_cache=use_cache)
+    return {
+        "source_text": source_text,
+        "outline": outline,
+        "role_summaries": role_summaries,
+        "dialogue": dialogue,
+    }
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import config
+
+
+class LazyResource:
+    """
+    A heavy resource (model, client) built on first use instead of at import time.
+    Records how long loading took and the error if it failed; a failed load is retried
+    on the next get().
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.loaded_at = None
+        self.error = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    try:
+                        self._value = self._loader()
+                    except Exception as e:
+                        self.error = str(e)
+                        print(f"Loading {self.name} failed: {e}")
+                        raise
+                    self.load_seconds = time.perf_counter() - start
+                    self.loaded_at = time.time()
+                    self.error = None
+                    self._loaded = True
+                    print(f"Loaded {self.name} in {self.load_seconds:.2f}s")
+        return self._value
+
+    def status(self):
+        return {
+            "loaded": self._loaded,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "loaded_at": self.loaded_at,
+            "error": self.error,
+        }
+
+
+_resources = {}
+_warmup_thread = None
+
+
+def register(name: str, loader) -> LazyResource:
+    return _resources.setdefault(name, LazyResource(name, loader))
+
+
+def override(name: str, loader) -> LazyResource:
+    """Replaces the loader of a resource (e.g. with a local fake for benchmarks); it reloads on next use."""
+    resource = _resources.setdefault(name, LazyResource(name, loader))
+    with resource._lock:
+        resource._loader = loader
+        resource._value = None
+        resource._loaded = False
+        resource.load_seconds = resource.loaded_at = resource.error = None
+    return resource
+
+
+def statuses():
+    return {name: resource.status() for name, resource in _resources.items()}
+
+
+def warmup_targets():
+    """Resources named in WARMUP_MODELS that are registered in this process."""
+    return [name for name in config.WARMUP_MODELS if name in _resources]
+
+
+def is_ready() -> bool:
+    """Ready once every warm-up target has loaded (immediately when warm-up is disabled)."""
+    return all(_resources[name].is_loaded for name in warmup_targets())
+
+
+def start_warmup():
+    """Loads the WARMUP_MODELS resources in a background thread, so startup is not blocked."""
+    global _warmup_thread
+    if _warmup_thread is not None or not warmup_targets():
+        return
+
+    def run():
+        for name in warmup_targets():
+            try:
+                _resources[name].get()
+            except Exception:
+                pass  # Already recorded on the resource and reported by /readyz
+
+    _warmup_thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+    _warmup_thread.start()
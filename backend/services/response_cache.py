@@ -0,0 +1,120 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+
+
+class SemanticResponseCache:
+    """
+    Per-space cache of answered queries keyed by query embedding. A new query whose
+    embedding has cosine similarity >= threshold with a cached one (that has not
+    outlived its TTL) reuses that answer. Each space keeps at most max_entries
+    answers and at most max_spaces spaces are kept, both evicted LRU.
+
+    Each space also has a generation, bumped by invalidate(). Callers read it with
+    generation() before computing an answer and pass it to store(), which drops answers
+    computed before an invalidation instead of caching them past it.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int, max_spaces: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_spaces = max_spaces
+        self._spaces = OrderedDict()  # space_id -> OrderedDict(entry_id -> entry)
+        self._generations = {}  # space_id -> number of invalidations so far
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    def generation(self, space_id: int) -> int:
+        with self._lock:
+            return self._generations.get(space_id, 0)
+
+    def lookup(self, space_id: int, query_embedding):
+        """Returns the best cached entry for the query, or None."""
+        vector = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            entries = self._spaces.get(space_id)
+            if entries:
+                for entry_id in [k for k, e in entries.items() if now - e["created_at"] > self.ttl_seconds]:
+                    del entries[entry_id]
+            if not entries:
+                self.misses += 1
+                return None
+
+            entry_ids = list(entries.keys())
+            similarities = np.stack([entries[k]["vector"] for k in entry_ids]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entries.move_to_end(entry_ids[best])
+            self._spaces.move_to_end(space_id)
+            self.hits += 1
+            entry = entries[entry_ids[best]]
+            return {**entry, "similarity": float(similarities[best])}
+
+    def store(self, space_id: int, query_text: str, query_embedding, response: str, sources=None, generation: int = None):
+        """Caches an answer, unless generation is given and the space was invalidated since."""
+        entry = {
+            "vector": self._normalize(query_embedding),
+            "query_text": query_text,
+            "response": response,
+            "sources": sources or [],
+            "created_at": time.time(),
+        }
+        with self._lock:
+            if generation is not None and generation != self._generations.get(space_id, 0):
+                self.stale_stores += 1
+                return
+            entries = self._spaces.setdefault(space_id, OrderedDict())
+            self._spaces.move_to_end(space_id)
+            entries[uuid.uuid4().hex] = entry
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            while len(self._spaces) > self.max_spaces:
+                self._spaces.popitem(last=False)
+
+    def invalidate(self, space_id: int):
+        """Drops every cached answer for a space, e.g. after new documents were ingested."""
+        with self._lock:
+            self._generations[space_id] = self._generations.get(space_id, 0) + 1
+            if self._spaces.pop(space_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "stale_stores_skipped": self.stale_stores,
+                "entries_per_space": {space_id: len(entries) for space_id, entries in self._spaces.items()},
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+response_cache = SemanticResponseCache(
+    threshold=config.RESPONSE_CACHE_THRESHOLD,
+    ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+    max_spaces=config.RESPONSE_CACHE_MAX_SPACES,
+)
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from services import bm25_store, embedding_service
+from services.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+
+_executor = ThreadPoolExecutor(max_workers=config.MULTI_SPACE_QUERY_WORKERS)
+
+
+def build_hybrid_retriever(space_id: int, vector_top_k: int = 5, bm25_top_k: int = 2, top_k: int = 2):
+    """Hybrid (vector + BM25) retriever over the cached index of a space."""
+    index, bm25_retriever = embedding_service.load_index_for_space(space_id)
+    return HybridRetriever(
+        index.as_retriever(similarity_top_k=vector_top_k),
+        bm25_store.with_top_k(bm25_retriever, bm25_top_k) if bm25_retriever is not None else None,
+        similarity_top_k=top_k,
+    )
+
+
+def retrieve_space_lists(space_id: int, query_bundle, vector_top_k: int = 5, bm25_top_k: int = 5):
+    """
+    Runs the vector and BM25 retrievers of one space. Returns their ranked lists (unfused),
+    so results from several spaces can be fused together. query_bundle should carry the
+    query embedding, so it is computed once rather than per space.
+    """
+    result_lists = build_hybrid_retriever(space_id, vector_top_k, bm25_top_k).retrieve_lists(query_bundle)
+    for results in result_lists:
+        for result in results:
+            # Lets merged results be traced back to their space, without showing up in prompts
+            result.node.metadata["space_id"] = space_id
+            for excluded in (result.node.excluded_llm_metadata_keys, result.node.excluded_embed_metadata_keys):
+                if "space_id" not in excluded:
+                    excluded.append("space_id")
+    return result_lists
+
+
+def retrieve_across_spaces(space_ids, query_bundle, top_k: int, vector_top_k: int = 5, bm25_top_k: int = 5):
+    """
+    Retrieves from every space concurrently on a bounded thread pool and fuses all the
+    ranked lists with reciprocal rank fusion under one global top_k.
+    Returns (fused NodeWithScore list, per-space report with latency and errors).
+    """
+    def timed(space_id):
+        start = time.perf_counter()
+        try:
+            return retrieve_space_lists(space_id, query_bundle, vector_top_k, bm25_top_k), None, time.perf_counter() - start
+        except Exception as e:
+            return [], str(e), time.perf_counter() - start
+
+    result_lists = []
+    report = []
+    for space_id, (lists, error, elapsed) in zip(space_ids, _executor.map(timed, space_ids)):
+        result_lists.extend(lists)
+        report.append({
+            "space_id": space_id,
+            "latency_ms": round(elapsed * 1000, 2),
+            "results": sum(len(results) for results in lists),
+            "error": error,
+        })
+    return reciprocal_rank_fusion(result_lists, top_k=top_k), report
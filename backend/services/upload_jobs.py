@@ -0,0 +1,157 @@
+from concurrent.futures import as_completed
+
+from sqlalchemy import insert, select
+
+import config
+from database import SessionLocal, documents_table
+from services.content_cache import content_cache
+from services import metrics
+from services.document_conversion import convert_file_timed, get_conversion_pool
+from services.jobs import Job, JobQueue
+
+upload_queue = JobQueue(
+    max_workers=config.UPLOAD_JOB_WORKERS,
+    max_per_key=config.UPLOAD_JOB_WORKERS,
+)
+
+
+def submit_upload(space_id: int, saved_files, replace_document_id: int = None):
+    """
+    Queues Docling conversion of files already written to disk.
+    saved_files is a list of (filename, file_path, file_hash) tuples, where file_path is named
+    after file_hash (see routers/upload.py) and is never rewritten with other bytes, so the text
+    cached under file_hash is always the conversion of that content. With replace_document_id,
+    the single file replaces that document instead of being added as a new one.
+    """
+    job = Job("upload", space_id, progress={
+        "files_total": len(saved_files),
+        "files_converted": 0,
+        "files_failed": 0,
+        "files_cached": 0,
+        "files": [{"filename": filename, "status": "queued"} for filename, _, _ in saved_files],
+    })
+    return upload_queue.submit(job, lambda job: _run_upload(job, saved_files, replace_document_id))
+
+
+def _run_upload(job: Job, saved_files, replace_document_id: int = None):
+    """
+    Files whose content hash is in the conversion cache skip Docling entirely; the rest
+    are fanned out over the process pool (identical files in one upload are converted once).
+    All documents are then inserted in a single transaction.
+    """
+    space_id = job.key
+    pool = get_conversion_pool()
+    file_statuses = job.progress["files"]
+    extracted_texts = [None] * len(saved_files)
+
+    futures = {}  # future -> positions of the files with that content
+    futures_by_hash = {}
+    for position, (_, file_path, file_hash) in enumerate(saved_files):
+        cached_text = content_cache.get_conversion(file_hash)
+        if cached_text is not None:
+            extracted_texts[position] = cached_text
+            file_statuses[position]["status"] = "cached"
+            job.progress["files_cached"] += 1
+            continue
+        file_statuses[position]["status"] = "converting"
+        if file_hash in futures_by_hash:
+            futures[futures_by_hash[file_hash]].append(position)
+            continue
+        future = pool.submit(convert_file_timed, file_path)
+        futures_by_hash[file_hash] = future
+        futures[future] = [position]
+
+    for future in as_completed(futures):
+        error = None
+        try:
+            extracted_text, conversion_seconds = future.result()
+            metrics.observe("docling_conversion", conversion_seconds, error=not extracted_text)
+            if not extracted_text:
+                error = "No text could be extracted from the file"
+        except Exception as e:
+            print(f"Error converting {saved_files[futures[future][0]][0]}: {e}")
+            extracted_text = None
+            error = str(e)
+        if extracted_text:
+            content_cache.put_conversion(saved_files[futures[future][0]][2], extracted_text)
+        for position in futures[future]:
+            extracted_texts[position] = extracted_text
+            if extracted_text:
+                file_statuses[position]["status"] = "converted"
+                job.progress["files_converted"] += 1
+            else:
+                file_statuses[position]["status"] = "failed"
+                file_statuses[position]["error"] = error
+                job.progress["files_failed"] += 1
+
+    if replace_document_id is not None:
+        if not extracted_texts[0]:
+            raise Exception(
+                f"Could not extract text from {saved_files[0][0]} ({file_statuses[0].get('error')}); "
+                f"document {replace_document_id} was left unchanged"
+            )
+        return _replace_document(job, replace_document_id, saved_files[0][0], extracted_texts[0])
+
+    rows = [
+        {"space_id": space_id, "title": filename, "extracted_text": extracted_texts[position]}
+        for position, (filename, _, _) in enumerate(saved_files)
+    ]
+    db = SessionLocal()
+    try:
+        db.execute(insert(documents_table), rows)
+        db.commit()
+    finally:
+        db.close()
+    for status in file_statuses:
+        status["stored"] = True
+
+    return {
+        "files": [
+            {
+                "filename": filename,
+                "extracted": bool(extracted_texts[position]),
+                "error": file_statuses[position].get("error"),
+            }
+            for position, (filename, _, _) in enumerate(saved_files)
+        ]
+    }
+
+
+def _replace_document(job: Job, document_id: int, filename: str, extracted_text: str):
+    """
+    Stores the new text of a replaced document. If the old version was embedded, only this
+    document is queued for re-embedding, which swaps out its previous nodes.
+    """
+    from services import embedding_service
+    from services.ingestion_jobs import submit_ingestion, submit_reindex
+
+    if not extracted_text:
+        raise Exception(f"Could not extract text from {filename}; document {document_id} was left unchanged")
+
+    space_id = job.key
+    db = SessionLocal()
+    try:
+        was_embedded = db.execute(
+            select(documents_table.c.is_embedded).where(documents_table.c.id == document_id)
+        ).scalar()
+        db.execute(
+            documents_table.update().where(documents_table.c.id == document_id)
+            .values(title=filename, extracted_text=extracted_text, is_embedded=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+    job.progress["files"][0]["stored"] = True
+
+    ingestion_job = None
+    if was_embedded:
+        if embedding_service.has_document_nodes(space_id, document_id):
+            ingestion_job = submit_ingestion(space_id, [document_id])
+        else:
+            ingestion_job = submit_reindex(space_id)  # Space indexed before nodes carried document ids
+
+    return {
+        "files": [{"filename": filename, "extracted": True}],
+        "document_id": document_id,
+        "ingestion_job_id": ingestion_job.id if ingestion_job else None,
+    }
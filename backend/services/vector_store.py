@@ -0,0 +1,169 @@
+"""
+Chroma access for every space, in one of two layouts (VECTOR_STORE_LAYOUT):
+  - per_space: one Chroma directory and collection per space, chroma_db/space_{id}
+  - shared:    one collection for all spaces in chroma_db/shared, each vector tagged with
+               its space_id and every query filtered on it
+Clients are opened once per directory and kept for the life of the process.
+
+Migrate existing per-space directories into the shared collection with:
+    python -m services.vector_store migrate [--space-ids 1 2 3] [--delete-source]
+"""
+import argparse
+import dataclasses
+import shutil
+import threading
+from pathlib import Path
+
+import chromadb
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import FilterCondition, MetadataFilter, MetadataFilters
+from llama_index.vector_stores.chroma import ChromaVectorStore
+
+import config
+
+LAYOUTS = ("per_space", "shared")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(path: Path):
+    """The process-wide PersistentClient for a Chroma directory."""
+    key = str(path.as_posix())
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            path.mkdir(parents=True, exist_ok=True)
+            client = chromadb.PersistentClient(path=key)
+            _clients[key] = client
+        return client
+
+
+def space_dir(space_id: int) -> Path:
+    return Path(config.CHROMA_PATH) / f"space_{space_id}"
+
+
+def space_collection_name(space_id: int) -> str:
+    return f"space_{space_id}_collection"
+
+
+def shared_collection():
+    return get_client(Path(config.CHROMA_PATH) / "shared").get_or_create_collection(config.CHROMA_SHARED_COLLECTION)
+
+
+class SpaceScopedChromaVectorStore(ChromaVectorStore):
+    """
+    ChromaVectorStore over the shared collection that only sees one space: added nodes
+    are tagged with space_id, and queries and deletes are filtered on it.
+    """
+
+    _space_id: int = PrivateAttr()
+
+    def __init__(self, chroma_collection, space_id: int):
+        super().__init__(chroma_collection=chroma_collection)
+        self._space_id = space_id
+
+    def add(self, nodes, **add_kwargs):
+        for node in nodes:
+            node.metadata["space_id"] = self._space_id
+            if "space_id" not in node.excluded_llm_metadata_keys:
+                node.excluded_llm_metadata_keys.append("space_id")
+            if "space_id" not in node.excluded_embed_metadata_keys:
+                node.excluded_embed_metadata_keys.append("space_id")
+        return super().add(nodes, **add_kwargs)
+
+    def query(self, query, **kwargs):
+        space_filter = MetadataFilter(key="space_id", value=self._space_id)
+        if query.filters is None:
+            filters = MetadataFilters(filters=[space_filter])
+        elif query.filters.condition in (None, FilterCondition.AND):
+            filters = MetadataFilters(filters=[space_filter, *query.filters.filters])
+        else:
+            filters = MetadataFilters(filters=[space_filter, query.filters])
+        return super().query(dataclasses.replace(query, filters=filters), **kwargs)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs):
+        self._collection.delete(where={"$and": [{"document_id": ref_doc_id}, {"space_id": self._space_id}]})
+
+
+def get_vector_store(space_id: int):
+    """Vector store of a space in the configured layout."""
+    if config.VECTOR_STORE_LAYOUT == "shared":
+        return SpaceScopedChromaVectorStore(shared_collection(), space_id)
+    if config.VECTOR_STORE_LAYOUT != "per_space":
+        raise ValueError(f"Unknown VECTOR_STORE_LAYOUT '{config.VECTOR_STORE_LAYOUT}'")
+    collection = get_client(space_dir(space_id)).get_or_create_collection(space_collection_name(space_id))
+    return ChromaVectorStore(chroma_collection=collection)
+
+
+def delete_space(space_id: int):
+    """Removes every vector of a space."""
+    if config.VECTOR_STORE_LAYOUT == "shared":
+        shared_collection().delete(where={"space_id": space_id})
+        return
+    try:
+        get_client(space_dir(space_id)).delete_collection(space_collection_name(space_id))
+    except Exception:
+        pass  # Nothing was ever embedded
+
+
+def migrate_to_shared(space_ids=None, batch_size: int = 1000, delete_source: bool = False):
+    """
+    Copies per-space collections into the shared collection, embeddings included (nothing is
+    re-embedded), tagging each vector with its space_id. Upserts by node id, so an interrupted
+    migration can simply be run again. Returns {space_id: vectors copied}.
+    """
+    if space_ids is None:
+        space_ids = sorted(
+            int(path.name.split("_", 1)[1])
+            for path in Path(config.CHROMA_PATH).glob("space_*")
+            if path.is_dir() and path.name.split("_", 1)[1].isdigit()
+        )
+    target = shared_collection()
+    copied = {}
+    for space_id in space_ids:
+        try:
+            source = get_client(space_dir(space_id)).get_collection(space_collection_name(space_id))
+        except Exception as e:
+            print(f"Space {space_id}: no per-space collection ({e}), skipped")
+            continue
+
+        total = source.count()
+        offset = 0
+        while offset < total:
+            batch = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                break
+            metadatas = [{**(metadata or {}), "space_id": space_id} for metadata in batch["metadatas"]]
+            target.upsert(
+                ids=batch["ids"],
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=metadatas,
+            )
+            offset += len(batch["ids"])
+
+        migrated = len(target.get(where={"space_id": space_id}, include=[])["ids"])
+        if migrated < total:
+            raise Exception(f"Space {space_id}: only {migrated} of {total} vectors found in the shared collection")
+        copied[space_id] = total
+        print(f"Space {space_id}: {total} vectors migrated")
+
+        if delete_source:
+            with _clients_lock:
+                _clients.pop(str(space_dir(space_id).as_posix()), None)
+            shutil.rmtree(space_dir(space_id), ignore_errors=True)
+    return copied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector store maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="Copy per-space Chroma directories into the shared collection")
+    migrate.add_argument("--space-ids", type=int, nargs="*", help="Spaces to migrate (default: every chroma_db/space_* directory)")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.add_argument("--delete-source", action="store_true", help="Remove each per-space directory once it is verified")
+    args = parser.parse_args()
+
+    result = migrate_to_shared(args.space_ids, batch_size=args.batch_size, delete_source=args.delete_source)
+    print(f"Migrated {sum(result.values())} vectors from {len(result)} spaces. Set VECTOR_STORE_LAYOUT=shared to use them.")
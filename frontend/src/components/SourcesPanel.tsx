@@ -15,10 +15,22 @@ const SourcesPanel: React.FC<SourcesPanelProps> = ({ documents, space_id }) => {
   
   const ingestMutation = useMutation({
     mutationFn: async () => {
-      return await axios.post(`http://127.0.0.1:8001/ingestion/${space_id}`)
+      const response = await axios.post(`http://127.0.0.1:8001/ingestion/${space_id}`)
+      // Nothing new to embed: the API answers right away without queueing a job
+      if (!response.data.job_id) return { queued: false }
+      // Ingestion runs as a background job: poll it until it finishes
+      const jobId = response.data.job_id
+      while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 2000))
+        const { data: job } = await axios.get(`http://127.0.0.1:8001/ingestion/jobs/${jobId}`)
+        if (job.status === 'completed') return { queued: true }
+        if (job.status === 'failed' || job.status === 'cancelled') {
+          throw new Error(job.error || `Ingestion job ${job.status}`)
+        }
+      }
     },
-    onSuccess: () => {
-      toast.success("Documents ingested successfully!")
+    onSuccess: (data) => {
+      toast.success(data.queued ? "Documents ingested successfully!" : "No new documents to ingest")
     },
     onError: (error) => {
       toast.error("Failed to ingest documents")
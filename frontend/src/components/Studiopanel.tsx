@@ -41,7 +41,16 @@ function Studiopanel({ spaceId }: StudiopanelProps) {
       const response = await axios.post(`http://127.0.0.1:8001/createpodcast/${spaceId}`, {
         focus_topic: topic
       })
-      return response.data
+      // Generation runs as a background job: poll it until the podcast is ready
+      const jobId = response.data.data.job_id
+      while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 2000))
+        const { data: job } = await axios.get(`http://127.0.0.1:8001/podcast/jobs/${jobId}`)
+        if (job.status === 'completed') return { data: job.result }
+        if (job.status === 'failed' || job.status === 'cancelled') {
+          throw new Error(job.error || `Podcast job ${job.status}`)
+        }
+      }
     },
     onSuccess: (data) => {
       toast.success("Podcast generated successfully!")